@@ -1,31 +1,104 @@
-import os
-from datetime import datetime, timedelta
+import time
+import asyncio
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
-from passlib.context import CryptContext
-from dotenv import load_dotenv
+import jwt
+import orjson
+from jwt import InvalidTokenError, DecodeError, ExpiredSignatureError
+from jwt.utils import base64url_decode
+from argon2 import PasswordHasher
+from argon2.exceptions import VerificationError, InvalidHash
+import bcrypt
+from cachetools import TTLCache
 
 from models import Funcionario
-
-load_dotenv()
+from config import settings
 
 # --- Configurações de Segurança ---
-SECRET_KEY = os.getenv("SECRET_KEY", "uma-chave-secreta-muito-dificil-de-adivinhar-012345")
+SECRET_KEY = settings().secret_key
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+class _OrjsonJWT(jwt.PyJWT):
+    """PyJWT usando orjson para (de)serializar o payload — o JSON, não o HMAC, domina o custo."""
+
+    def _encode_payload(self, payload, headers=None, json_encoder=None) -> bytes:
+        return orjson.dumps(payload)
+
+    def _decode_payload(self, decoded: dict) -> dict:
+        try:
+            payload = orjson.loads(decoded["payload"])
+        except orjson.JSONDecodeError as e:
+            raise DecodeError(f"Invalid payload string: {e}")
+        if not isinstance(payload, dict):
+            raise DecodeError("Invalid payload string: must be a json object")
+        return payload
+
+_jwt = _OrjsonJWT()
+
+# Argumentos do jwt.encode/decode montados uma única vez (evita recriar a lista de algoritmos a cada chamada)
+_ENCODE_KWARGS = {"key": SECRET_KEY, "algorithm": ALGORITHM}
+_DECODE_KWARGS = {"key": SECRET_KEY, "algorithms": [ALGORITHM], "options": {"require": ["exp", "sub"]}}
+
+# Custo do Argon2id: defaults de produção; reduza em dev/CI para acelerar logins.
+ARGON2_TIME_COST = settings().argon2_time_cost
+ARGON2_MEMORY_COST = settings().argon2_memory_cost
+
 # --- Hashing de Senha ---
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+_ph = PasswordHasher(time_cost=ARGON2_TIME_COST, memory_cost=ARGON2_MEMORY_COST, parallelism=1)
+_BCRYPT_PREFIXOS = ("$2a$", "$2b$", "$2y$")
 
 def verificar_senha(senha_plana: str, senha_hashed: str) -> bool:
-    """Verifica se a senha fornecida corresponde ao hash armazenado."""
-    return pwd_context.verify(senha_plana, senha_hashed)
+    """Verifica se a senha fornecida corresponde ao hash armazenado (Argon2id ou bcrypt legado)."""
+    if senha_hashed.startswith(_BCRYPT_PREFIXOS):
+        try:
+            return bcrypt.checkpw(senha_plana.encode(), senha_hashed.encode())
+        except ValueError:
+            return False
+    try:
+        return _ph.verify(senha_hashed, senha_plana)
+    except (VerificationError, InvalidHash):
+        return False
+
+def precisa_rehash(senha_hashed: str) -> bool:
+    """Indica se o hash é bcrypt legado ou usa parâmetros diferentes dos configurados."""
+    if senha_hashed.startswith(_BCRYPT_PREFIXOS):
+        return True
+    try:
+        return _ph.check_needs_rehash(senha_hashed)
+    except InvalidHash:
+        return True
 
 def gerar_hash_senha(senha: str) -> str:
     """Gera o hash de uma senha."""
-    return pwd_context.hash(senha)
+    return _ph.hash(senha)
+
+# Pool próprio para Argon2/bcrypt: cada verificação ocupa uma thread (e a memória do
+# Argon2) por dezenas de ms; limitado aqui, um pico de logins não esgota o executor
+# padrão que a ingestão também usa, nem a memória do processo.
+_pool_senhas = ThreadPoolExecutor(max_workers=4, thread_name_prefix="senha")
+
+async def _em_pool_senhas(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(_pool_senhas, fn, *args)
+
+async def gerar_hash_senha_async(senha: str) -> str:
+    """gerar_hash_senha fora do event loop, no pool de senhas."""
+    return await _em_pool_senhas(gerar_hash_senha, senha)
+
+# Cadastros em massa (/funcionarios/bulk) geram centenas de hashes de uma vez: eles
+# usam um pool separado, para que logins não esperem atrás da fila do lote.
+_pool_senhas_lote = ThreadPoolExecutor(max_workers=2, thread_name_prefix="senha-lote")
+
+async def gerar_hash_senha_lote(senha: str) -> str:
+    """gerar_hash_senha no pool dos cadastros em massa (não disputa com os logins)."""
+    return await asyncio.get_running_loop().run_in_executor(_pool_senhas_lote, gerar_hash_senha, senha)
+
+# Hash usado quando o email não existe: o login sempre paga uma verificação,
+# então o tempo de resposta não revela quais contas existem.
+_DUMMY_HASH = _ph.hash("dummy")
 
 # --- Gerenciamento de Token JWT ---
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
@@ -33,31 +106,106 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 def criar_token_acesso(data: dict):
     """Cria um novo token de acesso JWT."""
     para_codificar = data.copy()
-    expira_em = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    para_codificar.update({"exp": expira_em})
-    token_jwt_codificado = jwt.encode(para_codificar, SECRET_KEY, algorithm=ALGORITHM)
+    # 'exp' já em epoch (int): dispensa alocar datetime/timedelta a cada login
+    para_codificar["exp"] = int(time.time()) + ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    token_jwt_codificado = _jwt.encode(para_codificar, **_ENCODE_KWARGS)
     return token_jwt_codificado
 
+# Cache dos payloads já decodificados (chave: BLAKE2b de 128 bits do token), evitando
+# refazer a decodificação do JWT a cada requisição autenticada.
+_jwt_cache: TTLCache = TTLCache(maxsize=10000, ttl=30)
+# Cache negativo: tokens já recusados respondem 401 direto, sem HMAC nem consulta ao banco.
+_bad_token_cache: TTLCache = TTLCache(maxsize=10000, ttl=30)
+
+def _chave_token(token: str) -> bytes:
+    return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+def _recusar_sem_verificar(token: str) -> None:
+    """
+    Lê só o segmento do payload (base64 + orjson, sem HMAC) e recusa tokens malformados ou
+    expirados antes da verificação completa. Serve apenas para recusar: nada lido aqui é
+    confiável, e tokens que passam ainda vão pelo decode com assinatura.
+    """
+    try:
+        payload = orjson.loads(base64url_decode(token.split(".")[1]))
+    except (IndexError, ValueError) as e:  # binascii.Error e orjson.JSONDecodeError são ValueError
+        raise DecodeError(f"Invalid token: {e}")
+    exp = payload.get("exp") if isinstance(payload, dict) else None
+    if isinstance(exp, (int, float)) and exp <= time.time():
+        raise ExpiredSignatureError("Signature has expired")
+
+def _decodificar_token(token: str, chave: bytes) -> dict:
+    """Decodifica o JWT, reaproveitando o payload em cache enquanto ele não expirar."""
+    payload = _jwt_cache.get(chave)
+    if payload is not None and payload.get("exp", 0) > time.time():
+        return payload
+    _recusar_sem_verificar(token)
+    payload = _jwt.decode(token, **_DECODE_KWARGS)
+    _jwt_cache[chave] = payload
+    return payload
+
+# Cache dos funcionários autenticados (chave: email), poupando a ida ao MongoDB.
+# TTL curto: invalidar_usuario só limpa o worker que fez a alteração, então nos demais
+# um usuário editado ou excluído continua aceito por no máximo estes segundos.
+_user_cache: TTLCache = TTLCache(maxsize=5000, ttl=5)
+
+def invalidar_usuario(email: Optional[str]) -> None:
+    """Remove o funcionário do cache; chamar sempre que ele for alterado ou excluído."""
+    if email:
+        _user_cache.pop(email, None)
+
+# --- Login ---
+async def autenticar_funcionario(email: str, senha: str) -> Optional[Funcionario]:
+    """
+    Retorna o funcionário se email e senha conferem, ou None.
+    A verificação roda no pool de senhas (a extensão C libera o GIL) para não travar o event loop.
+    """
+    funcionario = await Funcionario.find_one(Funcionario.email == email)
+    senha_hashed = funcionario.senha if funcionario else _DUMMY_HASH
+    ok = await _em_pool_senhas(verificar_senha, senha, senha_hashed)
+    if not funcionario or not ok:
+        return None
+    if precisa_rehash(funcionario.senha):
+        # Migra hashes antigos/baratos para o custo atual no login bem-sucedido
+        funcionario.senha = await gerar_hash_senha_async(senha)
+        await funcionario.save()
+        invalidar_usuario(funcionario.email)
+    return funcionario
+
 # --- Dependência para Obter Usuário Logado ---
+async def obter_usuario_por_token(token: str) -> Optional[Funcionario]:
+    """Valida o JWT e retorna o funcionário correspondente, ou None se o token não for aceito."""
+    chave = _chave_token(token)
+    if chave in _bad_token_cache:
+        return None
+    try:
+        payload = _decodificar_token(token, chave)
+    except InvalidTokenError:
+        _bad_token_cache[chave] = True
+        return None
+    email = payload.get("sub")
+    if not isinstance(email, str):
+        _bad_token_cache[chave] = True
+        return None
+
+    funcionario = _user_cache.get(email)
+    if funcionario is None:
+        funcionario = await Funcionario.find_one(Funcionario.email == email)
+        if funcionario is None:
+            _bad_token_cache[chave] = True
+            return None
+        _user_cache[email] = funcionario
+    return funcionario
+
 async def get_usuario_logado(token: str = Depends(oauth2_scheme)) -> Funcionario:
     """
     Dependência para FastAPI: decodifica o token, valida e retorna o usuário do banco de dados.
     """
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Não foi possível validar as credenciais",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-    
-    funcionario = await Funcionario.find_one(Funcionario.email == email)
+    funcionario = await obter_usuario_por_token(token)
     if funcionario is None:
-        raise credentials_exception
-        
-    return funcionario
\ No newline at end of file
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Não foi possível validar as credenciais",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return funcionario
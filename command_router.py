@@ -1,19 +1,92 @@
 # command_router.py
 from datetime import date, timedelta
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Awaitable, Callable
 import re
-import dateparser
+import calendar
+from cachetools import TTLCache
 
 from beanie import PydanticObjectId
-from models import Projeto, Tarefa, Funcionario, StatusTarefa, PrioridadeTarefa
+from models import Projeto, Tarefa, Funcionario, StatusTarefa, PrioridadeTarefa, COLACAO_PT
+
+# ---------------------------
+# Padrões de comando
+# ---------------------------
+# Cada padrão usa grupos nomeados próprios; todos são combinados numa única
+# alternância compilada, e o nome do grupo externo (m.lastgroup) escolhe o handler.
+# A ordem do dict define a prioridade quando dois padrões casam na mesma posição.
+_PADROES = {
+    "prazo_projeto": r"muda[r]? o prazo do projeto (?P<pp_nome>.+?) para (?P<pp_prazo>.+)$",
+    "prazo_tarefa": r"muda[r]? o prazo da tarefa (?P<pt_nome>.+?) para (?P<pt_prazo>.+)$",
+    "adicionar_tarefa": r"adiciona[r]? a tarefa ['\"]?(?P<at_nome>.+?)['\"]? no projeto (?P<at_projeto>.+?), (?P<at_resp>.+?) vai ser a responsável",
+    "responsavel_tarefa": r"(?:atribui|muda) (?:a )?tarefa (?P<rt_nome>.+?) para (?P<rt_resp>.+)$",
+    "status_tarefa": r"marca[r]? a tarefa (?P<st_nome>.+?) como (?P<st_status>concluída|concluida|em andamento|congelada|não iniciada|nao iniciada)$",
+}
+_DISPATCH_RE = re.compile(
+    "|".join(f"(?P<{nome}>{padrao})" for nome, padrao in _PADROES.items()),
+    re.IGNORECASE,
+)
+# Todo comando contém ao menos um destes verbos; mensagens sem eles nem passam pela regex
+_CMD_KEYWORDS = ("muda", "adiciona", "atribui", "marca")
 
 # ---------------------------
 # Helpers
 # ---------------------------
+# Formas mais comuns de data nos comandos, resolvidas sem passar pelo dateparser
+_NUMEROS = {
+    "um": 1, "uma": 1, "dois": 2, "duas": 2, "três": 3, "tres": 3, "quatro": 4,
+    "cinco": 5, "seis": 6, "sete": 7, "oito": 8, "nove": 9, "dez": 10,
+}
+_RE_HOJE = re.compile(r"^hoje$")
+_RE_AMANHA = re.compile(r"^(depois de )?amanh[ãa]$")
+_RE_DAQUI = re.compile(
+    r"^(?:daqui(?: a)?|em|dentro de) (\d+|" + "|".join(_NUMEROS) + r") (dias?|semanas?|m[eê]s|meses)$"
+)
+_RE_DATA_BR = re.compile(r"^(\d{1,2})/(\d{1,2})/(\d{2,4})$")
+_RE_DATA_ISO = re.compile(r"^\d{4}-\d{2}-\d{2}")
+
+def _somar_meses(d: date, n: int) -> date:
+    mes = d.month - 1 + n
+    ano, mes = d.year + mes // 12, mes % 12 + 1
+    return date(ano, mes, min(d.day, calendar.monthrange(ano, mes)[1]))
+
+def _parse_data_rapida(txt: str) -> Optional[date]:
+    hoje = date.today()
+    if _RE_HOJE.match(txt):
+        return hoje
+    m = _RE_AMANHA.match(txt)
+    if m:
+        return hoje + timedelta(days=2 if m.group(1) else 1)
+    m = _RE_DAQUI.match(txt)
+    if m:
+        qtd = int(m.group(1)) if m.group(1).isdigit() else _NUMEROS[m.group(1)]
+        unidade = m.group(2)
+        if unidade.startswith("dia"):
+            return hoje + timedelta(days=qtd)
+        if unidade.startswith("semana"):
+            return hoje + timedelta(weeks=qtd)
+        return _somar_meses(hoje, qtd)
+    m = _RE_DATA_BR.match(txt)
+    if m:
+        dia, mes, ano = int(m.group(1)), int(m.group(2)), int(m.group(3))
+        return date(ano + 2000 if ano < 100 else ano, mes, dia)
+    if _RE_DATA_ISO.match(txt):
+        # Só a parte AAAA-MM-DD interessa: parse direto em date, sem montar datetime
+        return date.fromisoformat(txt[:10])
+    return None
+
 def _parse_relative_date(txt: str):
     """
     Entende coisas como 'daqui dois dias', 'amanhã', 'em 3 semanas', '15/10/2025'.
+    As formas comuns são resolvidas localmente; o dateparser só é usado como fallback.
     """
+    try:
+        rapida = _parse_data_rapida(txt.strip().lower())
+    except ValueError:
+        rapida = None
+    if rapida:
+        return rapida
+    # Import tardio: o dateparser carrega tabelas de locale pesadas na importação
+    import dateparser
     dt = dateparser.parse(
         txt,
         languages=["pt","pt-BR"],
@@ -21,107 +94,166 @@ def _parse_relative_date(txt: str):
     )
     return dt.date() if dt else None
 
+# Caches curtos (chave: texto normalizado -> _id) para absorver comandos repetidos
+# sobre o mesmo projeto/tarefa/pessoa numa conversa. Só o _id fica em cache: o custo
+# está em resolver o nome (com fallback em regex); o documento é sempre relido pelo _id.
+_proj_cache: TTLCache = TTLCache(maxsize=1024, ttl=30)
+_task_cache: TTLCache = TTLCache(maxsize=1024, ttl=30)
+_user_cache: TTLCache = TTLCache(maxsize=1024, ttl=30)
+
+def _chave(nome: str) -> str:
+    return nome.casefold().strip()
+
+def invalidar_documento(doc_id: Optional[PydanticObjectId]) -> None:
+    """Remove dos caches as entradas que apontam para o documento; chamar ao alterá-lo ou excluí-lo."""
+    for cache in (_proj_cache, _task_cache, _user_cache):
+        for chave in [k for k, v in list(cache.items()) if v == doc_id]:
+            cache.pop(chave, None)
+
+async def _resolver(modelo, cache: TTLCache, chave: str, buscar: Callable[[], Awaitable[Any]]):
+    doc_id = cache.get(chave)
+    if doc_id is not None:
+        doc = await modelo.get(doc_id)
+        if doc is not None:
+            return doc
+        cache.pop(chave, None)  # excluído desde que entrou no cache
+    doc = await buscar()
+    if doc is not None:
+        cache[chave] = doc.id
+    return doc
+
+async def _buscar_por_nome(modelo, chave: str, nome: str):
+    # Busca exata pelo índice em nome_lower; a regex (scan) fica só como fallback
+    return await modelo.find_one(modelo.nome_lower == chave) \
+        or await modelo.find_one(modelo.nome.regex(nome, options="i"))
+
 async def _find_project_by_name(nome: str) -> Optional[Projeto]:
-    return await Projeto.find_one(Projeto.nome.regex(nome, options="i"))
+    chave = _chave(nome)
+    return await _resolver(Projeto, _proj_cache, chave, lambda: _buscar_por_nome(Projeto, chave, nome))
 
 async def _find_task_by_name(nome: str) -> Optional[Tarefa]:
-    return await Tarefa.find_one(Tarefa.nome.regex(nome, options="i"))
+    chave = _chave(nome)
+    return await _resolver(Tarefa, _task_cache, chave, lambda: _buscar_por_nome(Tarefa, chave, nome))
 
-async def _find_user_by_name_or_email(token: str) -> Optional[Funcionario]:
+async def _query_user_exato(parts: list) -> Optional[Funcionario]:
+    # Igualdade com collation case-insensitive: usa o índice (nome, sobrenome) em vez de scan
+    if len(parts) >= 2:
+        u = await Funcionario.find_one({"nome": parts[0], "sobrenome": " ".join(parts[1:])}, collation=COLACAO_PT)
+        if u: return u
+    return await Funcionario.find_one({"nome": " ".join(parts)}, collation=COLACAO_PT)
+
+async def _query_user_by_name_or_email(token: str) -> Optional[Funcionario]:
+    parts = token.strip().split()
+    if not parts:
+        return None
+    if "@" not in token:
+        u = await _query_user_exato(parts)
+        if u: return u
+    # Fallback em camadas, cada uma limitada a 1, na ordem de prioridade (email > nome+sobrenome > nome)
     u = await Funcionario.find_one(Funcionario.email == token)
     if u: return u
-    parts = token.strip().split()
     if len(parts) >= 2:
         first, last = parts[0], parts[-1]
-        cand = await Funcionario.find_one(
-            Funcionario.nome.regex(first, "i"),
-            Funcionario.sobrenome.regex(last, "i")
-        )
-        if cand: return cand
+        u = await Funcionario.find_one(Funcionario.nome.regex(first, "i"), Funcionario.sobrenome.regex(last, "i"))
+        if u: return u
     return await Funcionario.find_one(Funcionario.nome.regex(token, "i"))
 
+async def _find_user_by_name_or_email(token: str) -> Optional[Funcionario]:
+    return await _resolver(Funcionario, _user_cache, _chave(token), lambda: _query_user_by_name_or_email(token))
+
+async def _atualizar(doc, campos: Dict[str, Any]) -> bool:
+    """
+    Grava só os campos alterados ($set) em vez de save(): não sobrescreve edições
+    concorrentes dos outros campos nem recria o documento se ele tiver sido excluído.
+    """
+    resultado = await type(doc).find_one(type(doc).id == doc.id).update({"$set": campos})
+    return bool(resultado and resultado.matched_count)
+
 # ---------------------------
 # Comandos suportados
 # ---------------------------
+async def _cmd_prazo_projeto(m: re.Match) -> Dict[str, Any]:
+    # "muda o prazo do projeto X para daqui dois dias"
+    nome_proj, prazo_txt = m.group("pp_nome").strip(), m.group("pp_prazo").strip()
+    proj = await _find_project_by_name(nome_proj)
+    if not proj:
+        return {"executado": False, "mensagem": f"Projeto '{nome_proj}' não encontrado."}
+    novo_prazo = _parse_relative_date(prazo_txt)
+    if not novo_prazo:
+        return {"executado": False, "mensagem": f"Não entendi a data '{prazo_txt}'."}
+    if not await _atualizar(proj, {"prazo": novo_prazo}):
+        return {"executado": False, "mensagem": f"Projeto '{nome_proj}' não encontrado."}
+    return {"executado": True, "mensagem": f"Prazo do projeto '{proj.nome}' atualizado para {novo_prazo.strftime('%d/%m/%Y')}."}
+
+async def _cmd_prazo_tarefa(m: re.Match) -> Dict[str, Any]:
+    # "muda o prazo da tarefa ABC para amanhã"
+    nome_t, prazo_txt = m.group("pt_nome").strip(), m.group("pt_prazo").strip()
+    t = await _find_task_by_name(nome_t)
+    if not t: return {"executado": False, "mensagem": f"Tarefa '{nome_t}' não encontrada."}
+    novo_prazo = _parse_relative_date(prazo_txt)
+    if not novo_prazo:
+        return {"executado": False, "mensagem": f"Não entendi a data '{prazo_txt}'."}
+    if not await _atualizar(t, {"prazo": novo_prazo}):
+        return {"executado": False, "mensagem": f"Tarefa '{nome_t}' não encontrada."}
+    return {"executado": True, "mensagem": f"Prazo da tarefa '{t.nome}' atualizado para {novo_prazo.strftime('%d/%m/%Y')}."}
+
+async def _cmd_adicionar_tarefa(m: re.Match) -> Dict[str, Any]:
+    # "adiciona a tarefa 'desenvolver frontend' no projeto Y, a ana vai ser a responsável"
+    nome_tarefa, nome_proj, nome_resp = m.group("at_nome").strip(), m.group("at_projeto").strip(), m.group("at_resp").strip()
+    proj = await _find_project_by_name(nome_proj)
+    if not proj: return {"executado": False, "mensagem": f"Projeto '{nome_proj}' não encontrado."}
+    user = await _find_user_by_name_or_email(nome_resp)
+    if not user: return {"executado": False, "mensagem": f"Responsável '{nome_resp}' não encontrado."}
+    novo = Tarefa(
+        nome=nome_tarefa,
+        projeto=proj,
+        responsavel=user,
+        prazo=date.today() + timedelta(days=7),
+        status=StatusTarefa.NAO_INICIADA
+    )
+    await novo.insert()
+    return {"executado": True, "mensagem": f"Tarefa '{nome_tarefa}' criada no projeto '{proj.nome}' e atribuída a {user.nome} {user.sobrenome}."}
+
+async def _cmd_responsavel_tarefa(m: re.Match) -> Dict[str, Any]:
+    # "atribui a tarefa X para o joão" | "muda a tarefa X para maria"
+    nome_t, nome_resp = m.group("rt_nome").strip(), m.group("rt_resp").strip()
+    t = await _find_task_by_name(nome_t)
+    if not t: return {"executado": False, "mensagem": f"Tarefa '{nome_t}' não encontrada."}
+    user = await _find_user_by_name_or_email(nome_resp)
+    if not user: return {"executado": False, "mensagem": f"Responsável '{nome_resp}' não encontrado."}
+    if not await _atualizar(t, {"responsavel": user.to_ref()}):
+        return {"executado": False, "mensagem": f"Tarefa '{nome_t}' não encontrada."}
+    return {"executado": True, "mensagem": f"Responsável da tarefa '{t.nome}' atualizado para {user.nome} {user.sobrenome}."}
+
+async def _cmd_status_tarefa(m: re.Match) -> Dict[str, Any]:
+    # "marca a tarefa X como concluída/em andamento/congelada/não iniciada"
+    nome_t, status_txt = m.group("st_nome").strip(), m.group("st_status").lower()
+    if status_txt == "concluida": status_txt = "concluída"
+    if status_txt == "nao iniciada": status_txt = "não iniciada"
+    t = await _find_task_by_name(nome_t)
+    if not t: return {"executado": False, "mensagem": f"Tarefa '{nome_t}' não encontrada."}
+    if not await _atualizar(t, {"status": StatusTarefa(status_txt)}):
+        return {"executado": False, "mensagem": f"Tarefa '{nome_t}' não encontrada."}
+    return {"executado": True, "mensagem": f"Tarefa '{t.nome}' marcada como {status_txt}."}
+
+_HANDLERS = {
+    "prazo_projeto": _cmd_prazo_projeto,
+    "prazo_tarefa": _cmd_prazo_tarefa,
+    "adicionar_tarefa": _cmd_adicionar_tarefa,
+    "responsavel_tarefa": _cmd_responsavel_tarefa,
+    "status_tarefa": _cmd_status_tarefa,
+}
+
 async def handle_command(texto: str) -> Optional[Dict[str, Any]]:
     """
     Retorna um dict com {"executado": True, "mensagem": "..."} se algum comando foi reconhecido.
     Caso contrário, retorna None.
     """
-
-    # 1) Mudar prazo de PROJETO
-    # "muda o prazo do projeto X para daqui dois dias"
-    m = re.search(r"muda[r]? o prazo do projeto (.+?) para (.+)$", texto, flags=re.IGNORECASE)
-    if m:
-        nome_proj, prazo_txt = m.group(1).strip(), m.group(2).strip()
-        proj = await _find_project_by_name(nome_proj)
-        if not proj:
-            return {"executado": False, "mensagem": f"Projeto '{nome_proj}' não encontrado."}
-        novo_prazo = _parse_relative_date(prazo_txt)
-        if not novo_prazo:
-            return {"executado": False, "mensagem": f"Não entendi a data '{prazo_txt}'."}
-        proj.prazo = novo_prazo
-        await proj.save()
-        return {"executado": True, "mensagem": f"Prazo do projeto '{proj.nome}' atualizado para {novo_prazo.strftime('%d/%m/%Y')}."}
-
-    # 2) Mudar prazo de TAREFA
-    # "muda o prazo da tarefa ABC para amanhã"
-    m = re.search(r"muda[r]? o prazo da tarefa (.+?) para (.+)$", texto, flags=re.IGNORECASE)
-    if m:
-        nome_t, prazo_txt = m.group(1).strip(), m.group(2).strip()
-        t = await _find_task_by_name(nome_t)
-        if not t: return {"executado": False, "mensagem": f"Tarefa '{nome_t}' não encontrada."}
-        novo_prazo = _parse_relative_date(prazo_txt)
-        if not novo_prazo:
-            return {"executado": False, "mensagem": f"Não entendi a data '{prazo_txt}'."}
-        t.prazo = novo_prazo
-        await t.save()
-        return {"executado": True, "mensagem": f"Prazo da tarefa '{t.nome}' atualizado para {novo_prazo.strftime('%d/%m/%Y')}."}
-
-    # 3) Adicionar tarefa em um PROJETO e atribuir responsável
-    # "adiciona a tarefa 'desenvolver frontend' no projeto Y, a ana vai ser a responsável"
-    m = re.search(r"adiciona[r]? a tarefa ['\"]?(.+?)['\"]? no projeto (.+?), (.+?) vai ser a responsável", texto, flags=re.IGNORECASE)
-    if m:
-        nome_tarefa, nome_proj, nome_resp = m.group(1).strip(), m.group(2).strip(), m.group(3).strip()
-        proj = await _find_project_by_name(nome_proj)
-        if not proj: return {"executado": False, "mensagem": f"Projeto '{nome_proj}' não encontrado."}
-        user = await _find_user_by_name_or_email(nome_resp)
-        if not user: return {"executado": False, "mensagem": f"Responsável '{nome_resp}' não encontrado."}
-        novo = Tarefa(
-            nome=nome_tarefa,
-            projeto=proj,
-            responsavel=user,
-            prazo=date.today() + timedelta(days=7),
-            status=StatusTarefa.NAO_INICIADA
-        )
-        await novo.insert()
-        return {"executado": True, "mensagem": f"Tarefa '{nome_tarefa}' criada no projeto '{proj.nome}' e atribuída a {user.nome} {user.sobrenome}."}
-
-    # 4) Alterar responsável da tarefa
-    # "atribui a tarefa X para o joão" | "muda responsável da tarefa X para maria"
-    m = re.search(r"(atribui|muda) (?:a )?tarefa (.+?) para (.+)$", texto, flags=re.IGNORECASE)
-    if m:
-        nome_t, nome_resp = m.group(2).strip(), m.group(3).strip()
-        t = await _find_task_by_name(nome_t)
-        if not t: return {"executado": False, "mensagem": f"Tarefa '{nome_t}' não encontrada."}
-        user = await _find_user_by_name_or_email(nome_resp)
-        if not user: return {"executado": False, "mensagem": f"Responsável '{nome_resp}' não encontrado."}
-        t.responsavel = user
-        await t.save()
-        return {"executado": True, "mensagem": f"Responsável da tarefa '{t.nome}' atualizado para {user.nome} {user.sobrenome}."}
-
-    # 5) Alterar status da tarefa
-    # "marca a tarefa X como concluída/em andamento/congelada/não iniciada"
-    m = re.search(r"marca[r]? a tarefa (.+?) como (concluída|concluida|em andamento|congelada|não iniciada|nao iniciada)$", texto, flags=re.IGNORECASE)
-    if m:
-        nome_t, status_txt = m.group(1).strip(), m.group(2).lower()
-        if status_txt == "concluida": status_txt = "concluída"
-        if status_txt == "nao iniciada": status_txt = "não iniciada"
-        t = await _find_task_by_name(nome_t)
-        if not t: return {"executado": False, "mensagem": f"Tarefa '{nome_t}' não encontrada."}
-        t.status = StatusTarefa(status_txt)
-        await t.save()
-        return {"executado": True, "mensagem": f"Tarefa '{t.nome}' marcada como {status_txt}."}
-
-    # Nenhum padrão encontrado
-    return None
+    t_low = texto.lower()
+    if not any(k in t_low for k in _CMD_KEYWORDS):
+        return None
+    m = _DISPATCH_RE.search(texto)
+    if not m:
+        # Nenhum padrão encontrado
+        return None
+    return await _HANDLERS[m.lastgroup](m)
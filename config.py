@@ -0,0 +1,31 @@
+# config.py
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional
+from dotenv import load_dotenv
+
+@dataclass(frozen=True)
+class Settings:
+    mongo_uri: Optional[str]
+    secret_key: str
+    argon2_time_cost: int
+    argon2_memory_cost: int
+    project_id: Optional[str]
+    location: str
+
+@lru_cache(maxsize=1)
+def settings() -> Settings:
+    """
+    Lê o .env e as variáveis de ambiente uma única vez por processo.
+    O load_dotenv também exporta GOOGLE_APPLICATION_CREDENTIALS para as libs do Google.
+    """
+    load_dotenv()
+    return Settings(
+        mongo_uri=os.getenv("MONGO_URI"),
+        secret_key=os.getenv("SECRET_KEY", "uma-chave-secreta-muito-dificil-de-adivinhar-012345"),
+        argon2_time_cost=int(os.getenv("ARGON2_TIME_COST", "2")),
+        argon2_memory_cost=int(os.getenv("ARGON2_MEMORY_COST", "65536")),
+        project_id=os.getenv("GOOGLE_CLOUD_PROJECT"),
+        location=os.getenv("GOOGLE_CLOUD_LOCATION", "us-central1"),
+    )
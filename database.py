@@ -1,33 +1,90 @@
 # database.py
-import os
-from typing import Optional
+from typing import Optional, List, Type
 from motor.motor_asyncio import AsyncIOMotorClient
-from beanie import init_beanie
-from dotenv import load_dotenv
+from beanie import init_beanie, Document
+from pymongo import ASCENDING
+from pymongo.errors import OperationFailure
 
-from models import Funcionario, Projeto, Tarefa, Calendario
+from models import Funcionario, Projeto, Tarefa, Calendario, JobIngestao
+from config import settings
 
-load_dotenv()
+# Códigos de erro do MongoDB tratados ao criar o índice de email
+_ERRO_CHAVE_DUPLICADA = 11000
+_ERROS_CONFLITO_INDICE = (85, 86)  # IndexOptionsConflict, IndexKeySpecsConflict
+
+async def garantir_indice_email() -> None:
+    """
+    Login e autenticação buscam sempre por email: cria o índice único. Se a base já tiver
+    emails repetidos (cadastros anteriores não checavam), registra o aviso e cria um índice
+    comum, para o startup seguir e as buscas continuarem sem scan. Remova as duplicatas,
+    apague o índice "email_1" e reinicie para ativar a unicidade.
+    """
+    colecao = Funcionario.get_motor_collection()
+    try:
+        await colecao.create_index([("email", ASCENDING)], unique=True, name="email_1")
+    except OperationFailure as e:
+        if e.code in _ERROS_CONFLITO_INDICE:
+            # Já existe um "email_1" com outras opções (ex.: o índice comum criado abaixo)
+            print(f"Aviso: já existe um índice de email sem unicidade; apague 'email_1' para ativá-la: {e}")
+        elif e.code == _ERRO_CHAVE_DUPLICADA:
+            print(f"Aviso: índice único de email não criado, há emails duplicados; usando índice comum: {e}")
+            try:
+                await colecao.create_index([("email", ASCENDING)], name="email_1")
+            except OperationFailure as e:
+                print(f"ERRO: índice de email não criado: {e}")
+        else:
+            print(f"ERRO: índice único de email não criado (código {e.code}): {e}")
 
 class Database:
     client: Optional[AsyncIOMotorClient] = None
 
+    def __init__(self, document_models: List[Type[Document]]):
+        self.document_models = document_models
+
+    async def __aenter__(self) -> "Database":
+        await self.initialize()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.close()
+
     async def initialize(self):
-        mongo_uri = os.getenv("MONGO_URI")
+        # Um único client (e pool) por processo: chamadas repetidas não abrem outro
+        if self.client is not None:
+            return
+        mongo_uri = settings().mongo_uri
         if not mongo_uri:
             raise ValueError("A variável de ambiente MONGO_URI não foi definida.")
 
-        self.client = AsyncIOMotorClient(mongo_uri)
-        
+        self.client = AsyncIOMotorClient(
+            mongo_uri,
+            maxPoolSize=100,
+            minPoolSize=10,
+            maxIdleTimeMS=30000,
+            waitQueueTimeoutMS=2000,
+            serverSelectionTimeoutMS=3000,
+            appname="ache-flow",
+        )
+        # Ping no startup: seleciona o servidor e abre a primeira conexão agora,
+        # em vez de cobrar o handshake (TCP+TLS) da primeira requisição.
+        await self.client.admin.command("ping")
+
         await init_beanie(
             database=self.client.get_default_database(),
-            document_models=[
-                Funcionario,
-                Projeto,
-                Tarefa,
-                Calendario
-            ]
+            document_models=self.document_models
         )
         print("Conexão com o banco de dados e inicialização do Beanie bem-sucedidas.")
+        await garantir_indice_email()
+
+    def close(self):
+        if self.client is not None:
+            self.client.close()
+            self.client = None
 
-db = Database()
\ No newline at end of file
+db = Database(document_models=[
+    Funcionario,
+    Projeto,
+    Tarefa,
+    Calendario,
+    JobIngestao
+])
\ No newline at end of file
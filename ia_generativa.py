@@ -1,15 +1,34 @@
-import os
-import vertexai
-from vertexai.generative_models import GenerativeModel
-from dotenv import load_dotenv
+import asyncio
+import hashlib
+from typing import TYPE_CHECKING, AsyncIterator
+from cachetools import TTLCache
 
-# Carrega as variáveis de ambiente (como GOOGLE_APPLICATION_CREDENTIALS) do arquivo .env
-load_dotenv()
+from config import settings
+
+if TYPE_CHECKING:
+    from vertexai.generative_models import GenerativeModel
 
 # A variável do modelo é definida globalmente, mas não inicializada aqui.
-model: GenerativeModel | None = None
+model: "GenerativeModel | None" = None
+
+# Controle das chamadas ao Vertex: no máximo N em voo, cada uma com tempo limite.
+# Perguntas idênticas que chegam enquanto a primeira ainda está em voo
+# compartilham a mesma chamada em vez de abrir outra.
+_MAX_CHAMADAS_SIMULTANEAS = 8
+_TIMEOUT_CHAMADA_S = 30
+_semaforo = asyncio.Semaphore(_MAX_CHAMADAS_SIMULTANEAS)
+_em_andamento: dict[str, asyncio.Future] = {}
+
+# Cache de respostas: a mesma pergunta (normalizada) sobre o mesmo contexto reaproveita
+# a resposta já gerada. Como o contexto traz as tarefas/projetos do usuário, qualquer
+# alteração neles muda a chave — não há invalidação manual a fazer.
+_cache_respostas: TTLCache = TTLCache(maxsize=1024, ttl=300)
 
-def inicializar_ia():
+def _chave_resposta(contexto: str, pergunta: str, nome_usuario: str) -> str:
+    pergunta_normalizada = " ".join(pergunta.casefold().split())
+    return hashlib.sha256("\x1f".join((nome_usuario, contexto, pergunta_normalizada)).encode()).hexdigest()
+
+def inicializar_ia(model_name: str = "gemini-2.0-flash"):
     """
     Inicializa o cliente do Vertex AI e carrega o modelo generativo.
     Esta função deve ser chamada apenas uma vez durante o startup do aplicativo.
@@ -19,19 +38,102 @@ def inicializar_ia():
     if model is None:
         print("Inicializando o cliente Vertex AI e carregando o modelo Gemini...")
         try:
-            PROJECT_ID = os.getenv("GOOGLE_CLOUD_PROJECT")
-            LOCATION = os.getenv("GOOGLE_CLOUD_LOCATION", "us-central1")
+            PROJECT_ID = settings().project_id
+            LOCATION = settings().location
 
             if not PROJECT_ID:
                 raise ValueError("A variável de ambiente GOOGLE_CLOUD_PROJECT não foi definida.")
 
+            # Import tardio: o SDK do Vertex é pesado e só é necessário com a IA configurada
+            import vertexai
+            from vertexai.generative_models import GenerativeModel
+
             vertexai.init(project=PROJECT_ID, location=LOCATION)
-            model = GenerativeModel("gemini-2.0-flash")
+            model = GenerativeModel(model_name)
             print("Modelo Gemini carregado e pronto para uso.")
         except Exception as e:
             print(f"ERRO CRÍTICO ao inicializar o Vertex AI: {e}")
             # Em caso de falha, 'model' continuará como None.
             
+# --- O NOVO MASTER PROMPT ---
+# Trechos fixos montados uma única vez; a cada chamada só os campos variáveis
+# (nome do usuário, contexto e pergunta) são concatenados entre eles.
+_PROMPT_PERSONA = """
+**PERSONA:** Você é o 'Ache', um assistente de produtividade virtual.
+
+**TOM E ESTILO:**
+- Seja sempre polido, positivo, prestativo e use emojis. 😊
+- Responda de forma curta e direta.
+- Use uma linguagem clara e simples.
+- Formate sua resposta usando quebras de linha para facilitar a leitura.
+- NUNCA use markdown, asteriscos (*) ou negrito.
+- Comece sempre se dirigindo ao funcionário pelo nome.
+
+**INFORMAÇÕES DISPONÍVEIS (CONTEXTO):**
+Você tem acesso aos seguintes dados sobre o trabalho do(a) """
+
+_PROMPT_ANTES_CONTEXTO = """:
+---
+"""
+
+_PROMPT_TAREFA = """
+---
+
+**TAREFA PRINCIPAL:**
+Sua tarefa é usar as INFORMAÇÕES DISPONÍVEIS para responder à PERGUNTA DO USUÁRIO de forma precisa e amigável. Analise o contexto para encontrar a resposta.
+- Para "priorizar" ou tarefas "urgentes", considere as tarefas com prazo mais próximo (e, se urgentes, de alta prioridade).
+- Para perguntas sobre status, prioridade, prazo, projetos ou funcionários, filtre o CONTEXTO pelo atributo correspondente antes de responder.
+- Se você não encontrar a resposta no contexto, diga que não encontrou a informação.
+
+**PERGUNTA DO USUÁRIO:**
+\""""
+
+_PROMPT_FECHAMENTO = """"
+
+**Agora, gere a sua resposta para o(a) """
+
+async def aquecer_ia():
+    """
+    Abre o canal gRPC do modelo (e obtém as credenciais) no startup, com uma chamada
+    barata de contagem de tokens. O SDK reutiliza esse mesmo client assíncrono em todas
+    as chamadas seguintes, então a primeira pergunta não paga o custo de conexão.
+    """
+    if model is None:
+        return
+    try:
+        await asyncio.wait_for(model.count_tokens_async("ping"), _TIMEOUT_CHAMADA_S)
+    except Exception as e:
+        print(f"Aviso: não foi possível aquecer a conexão com o Vertex AI: {e}")
+
+def _montar_prompt(contexto: str, pergunta: str, nome_usuario: str) -> str:
+    return "".join((
+        _PROMPT_PERSONA, nome_usuario, _PROMPT_ANTES_CONTEXTO, contexto,
+        _PROMPT_TAREFA, pergunta, _PROMPT_FECHAMENTO, nome_usuario, ":**\n",
+    ))
+
+_MSG_IA_INDISPONIVEL = "Desculpe, estou com um problema técnico no momento e não consigo processar sua pergunta. Tente novamente mais tarde."
+_FIM_STREAM = object()
+_MSG_ERRO_IA = "Desculpe, tive um problema ao tentar gerar sua resposta. Por favor, tente novamente."
+
+async def _chamar_modelo(prompt: str) -> str:
+    async def _gerar():
+        async with _semaforo:
+            return await model.generate_content_async(prompt)
+    # O limite cobre também a espera por uma vaga, como no streaming: com o semáforo
+    # saturado a chamada falha em _TIMEOUT_CHAMADA_S em vez de ficar na fila indefinidamente
+    response = await asyncio.wait_for(_gerar(), _TIMEOUT_CHAMADA_S)
+    return response.text
+
+async def _gerar_coalescido(prompt: str) -> str:
+    chave = hashlib.sha256(prompt.encode()).hexdigest()
+    chamada = _em_andamento.get(chave)
+    if chamada is None:
+        chamada = asyncio.ensure_future(_chamar_modelo(prompt))
+        _em_andamento[chave] = chamada
+        chamada.add_done_callback(lambda _: _em_andamento.pop(chave, None))
+    # shield: se um dos clientes desistir, a chamada segue para os demais
+    return await asyncio.shield(chamada)
+
 async def gerar_resposta_ia(contexto: str, pergunta: str, nome_usuario: str) -> str:
     """
     Monta o prompt mestre com um CONTEXTO completo e a PERGUNTA do usuário.
@@ -39,50 +141,69 @@ async def gerar_resposta_ia(contexto: str, pergunta: str, nome_usuario: str) ->
     # Verifica se o modelo foi inicializado com sucesso antes de usar.
     if model is None:
         print("Tentativa de uso do modelo de IA sem inicialização bem-sucedida.")
-        return "Desculpe, estou com um problema técnico no momento e não consigo processar sua pergunta. Tente novamente mais tarde."
-
-    # --- O NOVO MASTER PROMPT ---
-    prompt_completo = f"""
-    **PERSONA:** Você é o 'Ache', um assistente de produtividade virtual.
-
-    **TOM E ESTILO:**
-    - Seja sempre polido, positivo, prestativo e use emojis. 😊
-    - Responda de forma curta e direta.
-    - Use uma linguagem clara e simples.
-    - Formate sua resposta usando quebras de linha para facilitar a leitura.
-    - NUNCA use markdown, asteriscos (*) ou negrito.
-    - Comece sempre se dirigindo ao funcionário pelo nome.
-
-    **INFORMAÇÕES DISPONÍVEIS (CONTEXTO):**
-    Você tem acesso aos seguintes dados sobre o trabalho do(a) {nome_usuario}:
-    ---
-    {contexto}
-    ---
-
-    **TAREFA PRINCIPAL:**
-    Sua tarefa é usar as INFORMAÇÕES DISPONÍVEIS para responder à PERGUNTA DO USUÁRIO de forma precisa e amigável. Analise o contexto para encontrar a resposta.
-    - Se a pergunta for sobre "priorizar", analise as tarefas com prazo mais próximo.
-    - Se a pergunta for sobre tarefas "congeladas", filtre a lista de tarefas por esse status.
-    - Se a pergunta for sobre tarefas "não iniciadas", filtre a lista de tarefas por esse status.
-    - Se a pergunta for sobre tarefas "em andamento", filtre a lista de tarefas por esse status.
-    - Se a pergunta for sobre tarefas "concluídas", filtre a lista de tarefas por esse status.
-    - Se a pergunta for sobre tarefas "urgentes", analise as tarefas com prazo mais próximo e alta prioridade.
-    - Se a pergunta for sobre projetos, use a lista de projetos.
-    - Se a pergunta for sobre funcionários, use a lista de funcionários.
-    - Se a pergunta for sobre prazos, use as datas fornecidas.
-    - Se a pergunta for sobre prioridades, use os níveis de prioridade fornecidos.
-    - Se a pergunta for sobre status, use os status fornecidos.
-    - Se você não encontrar a resposta no contexto, diga que não encontrou a informação.
-
-    **PERGUNTA DO USUÁRIO:**
-    "{pergunta}"
-
-    **Agora, gere a sua resposta para o(a) {nome_usuario}:**
-    """
+        return _MSG_IA_INDISPONIVEL
+
+    chave = _chave_resposta(contexto, pergunta, nome_usuario)
+    resposta = _cache_respostas.get(chave)
+    if resposta is not None:
+        return resposta
+
+    prompt_completo = _montar_prompt(contexto, pergunta, nome_usuario)
 
     try:
-        response = await model.generate_content_async(prompt_completo)
-        return response.text
+        resposta = await _gerar_coalescido(prompt_completo)
     except Exception as e:
         print(f"Erro ao chamar a API do Vertex AI: {e}")
-        return "Desculpe, tive um problema ao tentar gerar sua resposta. Por favor, tente novamente."
\ No newline at end of file
+        return _MSG_ERRO_IA
+    _cache_respostas[chave] = resposta
+    return resposta
+
+async def gerar_resposta_ia_stream(contexto: str, pergunta: str, nome_usuario: str) -> AsyncIterator[str]:
+    """
+    Mesma resposta de gerar_resposta_ia, mas entregue em pedaços à medida que o modelo gera,
+    para o cliente exibir o início do texto sem esperar a resposta completa.
+    """
+    if model is None:
+        print("Tentativa de uso do modelo de IA sem inicialização bem-sucedida.")
+        yield _MSG_IA_INDISPONIVEL
+        return
+
+    chave = _chave_resposta(contexto, pergunta, nome_usuario)
+    resposta = _cache_respostas.get(chave)
+    if resposta is not None:
+        yield resposta
+        return
+
+    # A geração roda numa task própria, com o mesmo limite de tempo da chamada comum, e
+    # deposita os pedaços numa fila: a vaga do semáforo é liberada quando o modelo termina,
+    # e não quando um cliente lento acaba de ler a resposta.
+    fila: asyncio.Queue = asyncio.Queue()
+    prompt = _montar_prompt(contexto, pergunta, nome_usuario)
+
+    async def _gerar():
+        async with _semaforo:
+            stream = await model.generate_content_async(prompt, stream=True)
+            async for chunk in stream:
+                fila.put_nowait(chunk.text)
+
+    async def _produzir():
+        try:
+            await asyncio.wait_for(_gerar(), _TIMEOUT_CHAMADA_S)
+            fila.put_nowait(_FIM_STREAM)
+        except Exception as e:
+            fila.put_nowait(e)
+
+    produtor = asyncio.create_task(_produzir())
+    partes = []
+    try:
+        while (item := await fila.get()) is not _FIM_STREAM:
+            if isinstance(item, Exception):
+                print(f"Erro ao chamar a API do Vertex AI: {item}")
+                yield _MSG_ERRO_IA
+                return
+            partes.append(item)
+            yield item
+    finally:
+        # Cliente desconectou no meio: interrompe a geração (sem efeito se já terminou)
+        produtor.cancel()
+    _cache_respostas[chave] = "".join(partes)
@@ -1,149 +1,311 @@
 # ingest.py
 import io
 import re
-from typing import List, Optional, Tuple, Dict, Any, Iterable
-from datetime import date
+import asyncio
+import tempfile
+from typing import List, Optional, Tuple, Dict, Any, Iterable, Awaitable, Callable
+from datetime import date, datetime
+import ciso8601
 import pandas as pd
-import requests
-from bs4 import BeautifulSoup
-from docx import Document  # para .docx
+import httpx
+from cachetools import LRUCache
 from beanie import PydanticObjectId
+from beanie.operators import In
+from pymongo.errors import BulkWriteError
 
 from models import (
     Funcionario, Projeto, Tarefa,
-    TarefaCreate, ProjetoCreate, PrioridadeTarefa, StatusTarefa
+    FuncionarioCreate, TarefaCreate, JobIngestao,
+    PrioridadeTarefa, StatusTarefa
 )
 
+# ---------------------------
+# Constantes (montadas uma única vez)
+# ---------------------------
+_COLS_TAREFAS = frozenset({"nome da tarefa", "prazo", "nome do projeto", "email responsável"})
+_COLS_PROJETOS = frozenset({"nome do projeto", "responsável (email)", "prazo", "situação"})
+_COLS_PESSOAS = frozenset({"nome", "sobrenome", "email"})
+_TRUE_SET = frozenset({"true", "t", "1", "sim", "s", "yes", "y", "verdadeiro", "concluida", "concluída", "concluído", "done"})
+# Texto da planilha (minúsculo) -> enum; valores fora do mapa usam o padrão do modelo
+_PRIORIDADES = {
+    "baixa": PrioridadeTarefa.BAIXA, "média": PrioridadeTarefa.MEDIA,
+    "media": PrioridadeTarefa.MEDIA, "alta": PrioridadeTarefa.ALTA,
+}
+_STATUS = {
+    "em andamento": StatusTarefa.EM_ANDAMENTO, "congelada": StatusTarefa.CONGELADA,
+    "não iniciada": StatusTarefa.NAO_INICIADA, "nao iniciada": StatusTarefa.NAO_INICIADA,
+    "concluída": StatusTarefa.CONCLUIDA, "concluida": StatusTarefa.CONCLUIDA,
+}
+# Campo lógico -> cabeçalho esperado na planilha (comparado sem diferenciar maiúsculas)
+_CAMPOS_TAREFA = {
+    "nome": "Nome da Tarefa", "projeto": "Nome do Projeto", "responsavel": "Email Responsável",
+    "prazo": "Prazo", "descricao": "Descrição", "prioridade": "Prioridade", "status": "Status",
+    "concluido": "Concluído", "numero": "Número", "classificacao": "Classificação", "fase": "Fase",
+    "condicao": "Condição", "documento_referencia": "Documento de Referência",
+}
+_CAMPOS_PROJETO = {
+    "nome": "Nome do Projeto", "responsavel": "Responsável (email)", "prazo": "Prazo",
+    "situacao": "Situação", "descricao": "Descrição", "categoria": "Categoria",
+}
+_CAMPOS_PESSOA = {
+    "nome": "Nome", "sobrenome": "Sobrenome", "email": "Email",
+    "cargo": "Cargo", "departamento": "Departamento", "foto": "Foto",
+}
+_GID_RE = re.compile(r"[?&]gid=(\d+)")
+_EDIT_RE = re.compile(r"/edit.*")
+
 # ---------------------------
 # Utilidades de detecção
 # ---------------------------
-def _is_tasks_df(df: pd.DataFrame) -> bool:
-    cols = set(c.lower() for c in df.columns)
-    required = {"nome da tarefa", "prazo", "nome do projeto", "email responsável"}
-    return required.issubset(cols)
-
-def _is_projects_df(df: pd.DataFrame) -> bool:
-    cols = set(c.lower() for c in df.columns)
-    required = {"nome do projeto", "responsável (email)", "prazo", "situação"}
-    return required.issubset(cols)
-
-def _is_people_df(df: pd.DataFrame) -> bool:
-    cols = set(c.lower() for c in df.columns)
-    required = {"nome", "sobrenome", "email"}
-    return required.issubset(cols)
-
-def _normalize_bool(v: Any) -> bool:
-    if isinstance(v, bool): return v
-    if v is None: return False
-    s = str(v).strip().lower()
-    return s in {"true","1","sim","yes","verdadeiro"}
+def _is_tasks_df(cols: frozenset) -> bool:
+    return _COLS_TAREFAS.issubset(cols)
+
+def _is_projects_df(cols: frozenset) -> bool:
+    return _COLS_PROJETOS.issubset(cols)
+
+def _is_people_df(cols: frozenset) -> bool:
+    return _COLS_PESSOAS.issubset(cols)
+
+# Normalização de colunas inteiras com operações vetorizadas (.str), em vez de célula a célula
+def _texto_normalizado(df: pd.DataFrame, pos: int) -> pd.Series:
+    return df.iloc[:, pos].astype("string").str.strip().str.lower()
+
+def _classificar_coluna(df: pd.DataFrame, pos: Optional[int], mapa: Dict[str, Any], padrao: Any) -> List[Any]:
+    if pos is None:
+        return [padrao] * len(df)
+    return [mapa.get(v, padrao) for v in _texto_normalizado(df, pos).tolist()]
+
+def _booleanos_coluna(df: pd.DataFrame, pos: Optional[int]) -> List[bool]:
+    if pos is None:
+        return [False] * len(df)
+    return _texto_normalizado(df, pos).isin(_TRUE_SET).tolist()
 
 # ---------------------------
 # Roteamento DataFrame -> DB
 # ---------------------------
+# Documentos são acumulados e gravados com um insert_many a cada lote, em vez de um insert por linha.
+# Os lotes de um arquivo são gravados em paralelo (até _LOTES_SIMULTANEOS por vez).
+_LOTE_INSERCAO = 500
+_LOTES_SIMULTANEOS = 4
+
+async def _inserir_lote(modelo, docs: List[Any], linhas: List[int], errors: List[str]) -> int:
+    """Grava o lote (ordered=False) e retorna quantos foram criados; falhas viram erros por linha."""
+    try:
+        await modelo.insert_many(docs, ordered=False)
+        return len(docs)
+    except BulkWriteError as e:
+        for err in e.details.get("writeErrors", []):
+            errors.append(f"Linha {linhas[err['index']]}: {err.get('errmsg')}")
+        return e.details.get("nInserted", 0)
+
+async def _inserir_em_lotes(modelo, docs: List[Any], linhas: List[int], errors: List[str]) -> int:
+    """Divide os documentos em lotes e grava-os em paralelo; retorna o total criado."""
+    sem = asyncio.Semaphore(_LOTES_SIMULTANEOS)
+
+    async def _um(inicio: int) -> int:
+        fim = inicio + _LOTE_INSERCAO
+        async with sem:
+            return await _inserir_lote(modelo, docs[inicio:fim], linhas[inicio:fim], errors)
+
+    criados = await asyncio.gather(*(_um(i) for i in range(0, len(docs), _LOTE_INSERCAO)))
+    return sum(criados)
+
+def _data_celula(v: Any) -> Optional[date]:
+    """Converte uma célula: datas prontas passam direto, ISO via ciso8601 e o resto via pandas."""
+    if isinstance(v, datetime):
+        return v.date()
+    if isinstance(v, date):
+        return v
+    if isinstance(v, str):
+        try:
+            return ciso8601.parse_datetime(v.strip()).date()
+        except ValueError:
+            pass
+    d = pd.to_datetime(v, errors="coerce")
+    return d.date() if pd.notna(d) else None
+
+def _datas(serie: pd.Series) -> List[Optional[date]]:
+    """
+    Converte a coluna de datas inteira com um único pd.to_datetime, em vez de uma chamada por linha.
+    Células num formato diferente do inferido para a coluna caem na conversão individual.
+    """
+    convertidas = pd.to_datetime(serie, errors="coerce", cache=True)
+    datas = []
+    for bruto, d in zip(serie, convertidas):
+        if pd.notna(d):
+            datas.append(d.date())
+        else:
+            datas.append(_data_celula(bruto) if pd.notna(bruto) else None)
+    return datas
+
+def _posicoes(df: pd.DataFrame, campos: Dict[str, str]) -> Dict[str, Optional[int]]:
+    """Resolve, uma vez por arquivo, a posição de cada campo na tupla da linha (None se a coluna não existir)."""
+    por_cabecalho = {}
+    for i, c in enumerate(df.columns):
+        por_cabecalho.setdefault(c.lower(), i)
+    return {campo: por_cabecalho.get(cab.lower()) for campo, cab in campos.items()}
+
+def _celula(row: tuple, pos: Optional[int], padrao: Any = None) -> Any:
+    return row[pos] if pos is not None else padrao
+
+def _texto(v: Any) -> Optional[str]:
+    """Texto da célula sem espaços nas pontas, ou None se vazia/NaN; str já pronta não passa por str()."""
+    if type(v) is str:
+        return v.strip() or None
+    if v is None or pd.isna(v):
+        return None
+    if isinstance(v, float) and v.is_integer():
+        v = int(v)  # números vêm como float do pandas (ex.: 12.0 -> "12")
+    return str(v).strip() or None
+
+def _linhas(df: pd.DataFrame) -> Iterable[Tuple[int, int, tuple]]:
+    """
+    Percorre o DataFrame uma única vez como tuplas (posição, número da linha na planilha, valores),
+    sem montar uma Series por linha como o iterrows. O número vem do índice, que continua
+    apontando para a linha original mesmo depois de descartadas as linhas vazias.
+    """
+    for i, (idx, row) in enumerate(zip(df.index, df.itertuples(index=False, name=None))):
+        yield i, idx + 2, row
+
+async def _buscar_por(modelo, campo: str, valores: Iterable[Any]) -> Dict[Any, Any]:
+    """
+    Busca de uma vez (um único $in) os documentos cujo campo está entre os valores
+    distintos da planilha, em vez de um find_one por linha. Nada fica em cache entre
+    ingestões: cada execução vê o estado atual do banco (inclusive exclusões).
+    """
+    mapa = {}
+    distintos = list({_texto(v) for v in valores} - {None})
+    if distintos:
+        async for doc in modelo.find(In(getattr(modelo, campo), distintos)):
+            mapa.setdefault(getattr(doc, campo), doc)
+    return mapa
+
 async def _ingest_tasks_df(df: pd.DataFrame) -> Dict[str, Any]:
     created, errors = 0, []
-    for i, row in df.iterrows():
+    lote, linhas = [], []
+    p = _posicoes(df, _CAMPOS_TAREFA)
+    projetos = await _buscar_por(Projeto, "nome", df.iloc[:, p["projeto"]])
+    responsaveis = await _buscar_por(Funcionario, "email", df.iloc[:, p["responsavel"]])
+    prazos = _datas(df.iloc[:, p["prazo"]])
+    prioridades = _classificar_coluna(df, p["prioridade"], _PRIORIDADES, PrioridadeTarefa.MEDIA)
+    status = _classificar_coluna(df, p["status"], _STATUS, StatusTarefa.NAO_INICIADA)
+    concluidos = _booleanos_coluna(df, p["concluido"])
+    for i, n, row in _linhas(df):
         try:
-            projeto = await Projeto.find_one(Projeto.nome == row["Nome do Projeto"])
+            nome_proj = _texto(row[p["projeto"]])
+            projeto = projetos.get(nome_proj)
             if not projeto:
-                errors.append(f"Linha {i+2}: Projeto '{row['Nome do Projeto']}' não encontrado.")
+                errors.append(f"Linha {n}: Projeto '{nome_proj}' não encontrado.")
                 continue
-            responsavel = await Funcionario.find_one(Funcionario.email == row["Email Responsável"])
+            email_resp = _texto(row[p["responsavel"]])
+            responsavel = responsaveis.get(email_resp)
             if not responsavel:
-                errors.append(f"Linha {i+2}: Responsável '{row['Email Responsável']}' não encontrado.")
+                errors.append(f"Linha {n}: Responsável '{email_resp}' não encontrado.")
                 continue
 
-            prioridade = str(row.get("Prioridade","média")).lower()
-            if prioridade not in {"baixa","média","media","alta"}:
-                prioridade = "média"
-            if prioridade == "media": prioridade = "média"
-
-            status = str(row.get("Status","não iniciada")).lower()
-            if status not in {"em andamento","congelada","não iniciada","nao iniciada","concluída","concluida"}:
-                status = "não iniciada"
-            if status == "nao iniciada": status = "não iniciada"
-            if status == "concluida": status = "concluída"
-
-            concluido = _normalize_bool(row.get("Concluído", False))
-
-            data = TarefaCreate(
-                nome=row["Nome da Tarefa"],
-                projeto_id=str(projeto.id),
-                responsavel_id=str(responsavel.id),
-                descricao=row.get("Descrição"),
-                prioridade=PrioridadeTarefa(prioridade),
-                status=StatusTarefa(status),
-                prazo=pd.to_datetime(row["Prazo"]).date(),
-                numero=row.get("Número"),
-                classificacao=row.get("Classificação"),
-                fase=row.get("Fase"),
-                condicao=row.get("Condição"),
-                documento_referencia=row.get("Documento de Referência"),
-                concluido=concluido
+            # Tarefa direto (o Document já valida os campos), sem o TarefaCreate intermediário
+            tarefa = Tarefa(
+                nome=_texto(row[p["nome"]]),
+                projeto=projeto,
+                responsavel=responsavel,
+                descricao=_texto(_celula(row, p["descricao"])),
+                prioridade=prioridades[i],
+                status=status[i],
+                prazo=prazos[i],
+                numero=_texto(_celula(row, p["numero"])),
+                classificacao=_texto(_celula(row, p["classificacao"])),
+                fase=_texto(_celula(row, p["fase"])),
+                condicao=_texto(_celula(row, p["condicao"])),
+                documento_referencia=_texto(_celula(row, p["documento_referencia"])),
+                concluido=concluidos[i]
             )
-            tarefa = Tarefa(**data.dict(exclude={"projeto_id","responsavel_id"}),
-                            projeto=projeto, responsavel=responsavel)
-            await tarefa.insert()
-            created += 1
+            tarefa.sincronizar_nome_lower()  # insert_many não dispara os eventos do Beanie
+            lote.append(tarefa)
+            linhas.append(n)
         except Exception as e:
-            errors.append(f"Linha {i+2}: {e}")
+            errors.append(f"Linha {n}: {e}")
+    created += await _inserir_em_lotes(Tarefa, lote, linhas, errors)
     return {"type":"tarefas", "criados": created, "erros": errors}
 
 async def _ingest_projects_df(df: pd.DataFrame) -> Dict[str, Any]:
     created, errors = 0, []
-    for i, row in df.iterrows():
+    lote, linhas = [], []
+    p = _posicoes(df, _CAMPOS_PROJETO)
+    responsaveis = await _buscar_por(Funcionario, "email", df.iloc[:, p["responsavel"]])
+    prazos = _datas(df.iloc[:, p["prazo"]])
+    for i, n, row in _linhas(df):
         try:
-            resp = await Funcionario.find_one(Funcionario.email == row["Responsável (email)"])
+            email_resp = _texto(row[p["responsavel"]])
+            resp = responsaveis.get(email_resp)
             if not resp:
-                errors.append(f"Linha {i+2}: Responsável '{row['Responsável (email)']}' não encontrado.")
+                errors.append(f"Linha {n}: Responsável '{email_resp}' não encontrado.")
                 continue
-            data = ProjetoCreate(
-                nome=row["Nome do Projeto"],
-                responsavel_id=str(resp.id),
-                descricao=row.get("Descrição"),
-                categoria=row.get("Categoria"),
-                situacao=row["Situação"],
-                prazo=pd.to_datetime(row["Prazo"]).date()
+            projeto = Projeto(
+                nome=_texto(row[p["nome"]]),
+                responsavel=resp,
+                descricao=_texto(_celula(row, p["descricao"])),
+                categoria=_texto(_celula(row, p["categoria"])),
+                situacao=_texto(row[p["situacao"]]),
+                prazo=prazos[i]
             )
-            projeto = Projeto(**data.dict(exclude={"responsavel_id"}), responsavel=resp)
-            await projeto.insert()
-            created += 1
+            projeto.sincronizar_nome_lower()  # insert_many não dispara os eventos do Beanie
+            lote.append(projeto)
+            linhas.append(n)
         except Exception as e:
-            errors.append(f"Linha {i+2}: {e}")
+            errors.append(f"Linha {n}: {e}")
+    created += await _inserir_em_lotes(Projeto, lote, linhas, errors)
     return {"type":"projetos", "criados": created, "erros": errors}
 
 async def _ingest_people_df(df: pd.DataFrame) -> Dict[str, Any]:
     created, errors, skipped_dupes = 0, [], 0
-    for i, row in df.iterrows():
+    lote, linhas = [], []
+    p = _posicoes(df, _CAMPOS_PESSOA)
+    # emails já cadastrados no banco ou já enfileirados neste arquivo
+    vistos = set(await _buscar_por(Funcionario, "email", df.iloc[:, p["email"]]))
+    for _, n, row in _linhas(df):
         try:
-            email = row["Email"]
-            exists = await Funcionario.find_one(Funcionario.email == email)
-            if exists:
+            email = _texto(row[p["email"]])
+            if email in vistos:
                 skipped_dupes += 1
                 continue
             fun = Funcionario(
-                nome=row["Nome"],
-                sobrenome=row["Sobrenome"],
+                nome=_texto(row[p["nome"]]),
+                sobrenome=_texto(row[p["sobrenome"]]),
                 email=email,
                 senha="hash-placeholder",  # substitua se quiser fluxo de login por ingestão
-                cargo=row.get("Cargo"),
-                departamento=row.get("Departamento"),
-                fotoPerfil=row.get("Foto")
+                cargo=_texto(_celula(row, p["cargo"])),
+                departamento=_texto(_celula(row, p["departamento"])),
+                fotoPerfil=_texto(_celula(row, p["foto"]))
             )
-            await fun.insert()
-            created += 1
+            lote.append(fun)
+            linhas.append(n)
+            vistos.add(email)
         except Exception as e:
-            errors.append(f"Linha {i+2}: {e}")
+            errors.append(f"Linha {n}: {e}")
+    created += await _inserir_em_lotes(Funcionario, lote, linhas, errors)
     return {"type":"funcionarios", "criados": created, "ignorados_existentes": skipped_dupes, "erros": errors}
 
+def _ler_csv(fonte, limit_rows: Optional[int] = None) -> pd.DataFrame:
+    # O engine pyarrow é bem mais rápido, mas não aceita nrows; com limite, o engine C para de ler cedo
+    if limit_rows is None:
+        return pd.read_csv(fonte, engine="pyarrow")
+    return pd.read_csv(fonte, nrows=limit_rows)
+
+def _ler_excel(fonte, limit_rows: Optional[int] = None) -> pd.DataFrame:
+    # calamine (Rust) lê planilhas bem mais rápido que o openpyxl
+    return pd.read_excel(fonte, engine="calamine", nrows=limit_rows)
+
 async def _route_df(df: pd.DataFrame) -> Dict[str, Any]:
     df.columns = [c.strip() for c in df.columns]
-    if _is_tasks_df(df):
+    # linhas totalmente vazias (comuns no fim de planilhas) são descartadas de uma vez
+    df = df.dropna(how="all")
+    # cabeçalhos em minúsculo calculados uma vez e reaproveitados pelas três detecções
+    cols = frozenset(c.lower() for c in df.columns)
+    if _is_tasks_df(cols):
         return await _ingest_tasks_df(df)
-    if _is_projects_df(df):
+    if _is_projects_df(cols):
         return await _ingest_projects_df(df)
-    if _is_people_df(df):
+    if _is_people_df(cols):
         return await _ingest_people_df(df)
     return {"type":"desconhecido","criados":0,"erros":["Layout de colunas não reconhecido."]}
 
@@ -153,13 +315,13 @@ async def _route_df(df: pd.DataFrame) -> Dict[str, Any]:
 async def ingest_file(filename: str, contents: bytes) -> Dict[str, Any]:
     try:
         if filename.lower().endswith(".csv"):
-            df = pd.read_csv(io.BytesIO(contents))
+            df = await asyncio.to_thread(_ler_csv, io.BytesIO(contents))
             return await _route_df(df)
         elif filename.lower().endswith(".xlsx"):
-            df = pd.read_excel(io.BytesIO(contents))
+            df = await asyncio.to_thread(_ler_excel, io.BytesIO(contents))
             return await _route_df(df)
         elif filename.lower().endswith(".docx"):
-            links = extract_links_from_docx(io.BytesIO(contents))
+            links = await asyncio.to_thread(extract_links_from_docx, io.BytesIO(contents))
             return await follow_links_and_ingest(links)
         else:
             return {"type":"desconhecido","criados":0,"erros":[f"Formato não suportado: {filename}"]}
@@ -169,19 +331,83 @@ async def ingest_file(filename: str, contents: bytes) -> Dict[str, Any]:
 # ---------------------------
 # Entrada por LINK de DOC
 # ---------------------------
-def fetch_text(url: str) -> str:
-    resp = requests.get(url, timeout=30)
+# Cliente HTTP assíncrono compartilhado (pool de conexões keep-alive).
+# Aberto no startup da API; criado sob demanda se usado fora dela.
+_http: Optional[httpx.AsyncClient] = None
+
+def abrir_http() -> httpx.AsyncClient:
+    global _http
+    if _http is None:
+        _http = httpx.AsyncClient(
+            timeout=60,
+            follow_redirects=True,
+            # retries: refaz a conexão em falhas de connect (não repete respostas HTTP de erro)
+            transport=httpx.AsyncHTTPTransport(
+                http2=True,
+                retries=3,
+                limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+            ),
+        )
+    return _http
+
+async def fechar_http() -> None:
+    global _http
+    if _http is not None:
+        await _http.aclose()
+        _http = None
+
+# Validadores HTTP (ETag/Last-Modified) do último download de cada URL, junto do resultado já
+# processado. Com 304 o conteúdo não mudou: reaproveita o resultado sem baixar nem reprocessar.
+# O LRU é limitado pela memória ocupada (bytes), não pelo número de entradas: resultados
+# maiores que o orçamento inteiro não são guardados.
+_CACHE_HTTP_MAX_BYTES = 64 * 1024 * 1024
+
+def _tamanho_entrada(entrada: Dict[str, Any]) -> int:
+    valor = entrada["valor"]
+    if isinstance(valor, pd.DataFrame):
+        return int(valor.memory_usage(deep=True).sum())
+    if isinstance(valor, str):
+        return len(valor)
+    return 1
+
+_cache_http: LRUCache = LRUCache(maxsize=_CACHE_HTTP_MAX_BYTES, getsizeof=_tamanho_entrada)
+
+def _cabecalhos_condicionais(entrada: Optional[Dict[str, Any]]) -> Dict[str, str]:
+    headers = {}
+    if entrada and entrada["etag"]:
+        headers["If-None-Match"] = entrada["etag"]
+    if entrada and entrada["last_modified"]:
+        headers["If-Modified-Since"] = entrada["last_modified"]
+    return headers
+
+def _guardar_http(chave: Tuple, r: httpx.Response, valor: Any) -> None:
+    etag, last_modified = r.headers.get("ETag"), r.headers.get("Last-Modified")
+    if not (etag or last_modified):
+        return
+    entrada = {"etag": etag, "last_modified": last_modified, "valor": valor}
+    if _tamanho_entrada(entrada) > _CACHE_HTTP_MAX_BYTES:
+        _cache_http.pop(chave, None)  # não deixa um resultado antigo responder ao próximo 304
+        return
+    _cache_http[chave] = entrada
+
+async def fetch_text(url: str) -> str:
+    chave = ("texto", url)
+    entrada = _cache_http.get(chave)
+    resp = await abrir_http().get(url, timeout=30, headers=_cabecalhos_condicionais(entrada))
+    if resp.status_code == 304 and entrada:
+        return entrada["valor"]
     resp.raise_for_status()
+    _guardar_http(chave, resp, resp.text)
     return resp.text
 
 def extract_links_from_html(html: str) -> List[str]:
-    soup = BeautifulSoup(html, "html.parser")
-    links = []
-    for a in soup.find_all("a", href=True):
-        links.append(a["href"])
-    return links
+    # Parser Lexbor (C) em vez do html.parser puro-Python do BeautifulSoup
+    from selectolax.lexbor import LexborHTMLParser
+    tree = LexborHTMLParser(html)
+    return [a.attributes["href"] for a in tree.css("a[href]") if a.attributes.get("href")]
 
 def extract_links_from_docx(filelike) -> List[str]:
+    from docx import Document  # import tardio: python-docx/lxml só quando chega um .docx
     doc = Document(filelike)
     links = []
     # varredura por relationships (método mais robusto no python-docx)
@@ -195,9 +421,9 @@ def _guess_export_url(u: str, sheet_index: Optional[int]) -> Tuple[str, Optional
     Produz uma URL exportável quando possível.
     """
     if "docs.google.com/spreadsheets" in u:
-        gid_match = re.search(r"[?&]gid=(\d+)", u)
+        gid_match = _GID_RE.search(u)
         gid = gid_match.group(1) if gid_match else None
-        base = re.sub(r"/edit.*","",u)
+        base = _EDIT_RE.sub("", u)
         if gid:
             return f"{base}/export?format=csv&gid={gid}", "csv"
         else:
@@ -208,41 +434,99 @@ def _guess_export_url(u: str, sheet_index: Optional[int]) -> Tuple[str, Optional
         return u, "csv"
     return u, None
 
-def _read_tabular_from_url(u: str, limit_rows: Optional[int]) -> Optional[pd.DataFrame]:
-    url_export, ext = _guess_export_url(u, sheet_index=None)
-    r = requests.get(url_export, timeout=60)
-    r.raise_for_status()
-    content = r.content
+# Downloads acima deste tamanho vão para um arquivo temporário em vez de ficarem na memória
+_SPOOL_MAX_BYTES = 8 * 1024 * 1024
+
+async def _baixar(url: str, headers: Optional[Dict[str, str]] = None) -> Tuple[Optional[tempfile.SpooledTemporaryFile], httpx.Response]:
+    """
+    Baixa a URL em streaming, sem manter o corpo inteiro como bytes na memória.
+    Retorna (None, resposta) quando o servidor responde 304.
+    """
+    arquivo = tempfile.SpooledTemporaryFile(max_size=_SPOOL_MAX_BYTES)
+    try:
+        async with abrir_http().stream("GET", url, headers=headers) as r:
+            if r.status_code == 304:
+                arquivo.close()
+                return None, r
+            r.raise_for_status()
+            async for bloco in r.aiter_bytes():
+                arquivo.write(bloco)
+    except BaseException:
+        arquivo.close()
+        raise
+    arquivo.seek(0)
+    return arquivo, r
+
+def _tabela_html(html: str) -> Optional[pd.DataFrame]:
+    """
+    Primeira <table> do HTML como DataFrame (primeira linha = cabeçalho), lida com o
+    parser Lexbor em vez do pd.read_html (lxml/html5lib + BeautifulSoup).
+    """
+    from selectolax.lexbor import LexborHTMLParser
+    tabela = LexborHTMLParser(html).css_first("table")
+    if tabela is None:
+        return None
+    linhas = [[c.text(strip=True) or None for c in tr.css("th, td")] for tr in tabela.css("tr")]
+    linhas = [l for l in linhas if l]
+    if not linhas:
+        return None
+    cabecalho = [c or "" for c in linhas[0]]
+    largura = len(cabecalho)
+    corpo = [(l + [None] * largura)[:largura] for l in linhas[1:]]
+    return pd.DataFrame(corpo, columns=cabecalho)
+
+def _parse_tabular(arquivo, ext: Optional[str], limit_rows: Optional[int]) -> Optional[pd.DataFrame]:
     if ext == "csv":
-        df = pd.read_csv(io.BytesIO(content))
+        df = _ler_csv(arquivo, limit_rows)
     elif ext == "xlsx":
-        df = pd.read_excel(io.BytesIO(content))
+        df = _ler_excel(arquivo, limit_rows)
     else:
         # tenta extrair primeira tabela HTML
-        try:
-            df_list = pd.read_html(io.BytesIO(content))
-        except Exception:
-            try:
-                df_list = pd.read_html(content.decode("utf-8", errors="ignore"))
-            except Exception:
-                df_list = []
-        if not df_list:
+        df = _tabela_html(arquivo.read().decode("utf-8", errors="ignore"))
+        if df is None:
             return None
-        df = df_list[0]
     if limit_rows is not None:
         df = df.head(limit_rows)
     return df
 
-async def follow_links_and_ingest(links: List[str], pick_index: Optional[int]=None, limit_rows: Optional[int]=None) -> Dict[str, Any]:
-    """
-    - Se pick_index for None: percorre todos os links e tenta ingerir.
-    - Se pick_index >=1: pega só o N-ésimo link (ex.: 'terceira planilha' => pick_index=3).
-    """
+async def _read_tabular_from_url(u: str, limit_rows: Optional[int]) -> Optional[pd.DataFrame]:
+    url_export, ext = _guess_export_url(u, sheet_index=None)
+    chave = ("tabela", url_export, limit_rows)
+    entrada = _cache_http.get(chave)
+    arquivo, r = await _baixar(url_export, _cabecalhos_condicionais(entrada))
+    if arquivo is None:
+        # 304 (só acontece com entrada em cache). Cópia rasa: _route_df renomeia colunas
+        # e não deve alterar o DataFrame guardado.
+        df = entrada["valor"] if entrada else None
+        return df.copy(deep=False) if df is not None else None
+    with arquivo:
+        # Parsing é CPU-bound: roda em thread para não travar o event loop
+        df = await asyncio.to_thread(_parse_tabular, arquivo, ext, limit_rows)
+    _guardar_http(chave, r, df)
+    return df
+
+# Limite de downloads de planilhas em paralelo (compartilhado entre requisições)
+_DOWNLOADS_SIMULTANEOS = 8
+_sem_downloads = asyncio.Semaphore(_DOWNLOADS_SIMULTANEOS)
+_DOCS_SIMULTANEOS = 4
+
+async def _ler_link(u: str, limit_rows: Optional[int]) -> Optional[pd.DataFrame]:
+    async with _sem_downloads:
+        return await _read_tabular_from_url(u, limit_rows)
+
+async def _baixar_links(links: List[str], pick_index: Optional[int], limit_rows: Optional[int]) -> Tuple[List[str], List[Any]]:
+    """Escolhe os links (pick_index) e baixa as tabelas em paralelo; erros voltam como exceção no lugar do DataFrame."""
     picked = [links[pick_index-1]] if pick_index and 1 <= pick_index <= len(links) else links
+    dfs = await asyncio.gather(*(_ler_link(u, limit_rows) for u in picked), return_exceptions=True)
+    return picked, list(dfs)
+
+async def _gravar_links(picked: List[str], dfs: List[Any]) -> Dict[str, Any]:
+    """Grava as tabelas já baixadas uma a uma, na ordem dos links."""
     summary = []
-    for u in picked:
+    for u, df in zip(picked, dfs):
         try:
-            df = _read_tabular_from_url(u, limit_rows)
+            if isinstance(df, Exception):
+                raise df
             if df is None:
                 summary.append({"link": u, "resultado": {"type":"ignorado","criados":0,"erros":["Não foi possível ler tabela."]}})
                 continue
@@ -252,12 +536,21 @@ async def follow_links_and_ingest(links: List[str], pick_index: Optional[int]=No
             summary.append({"link": u, "resultado": {"type":"erro","criados":0,"erros":[str(e)]}})
     return {"links_processados": len(picked), "itens": summary}
 
+async def follow_links_and_ingest(links: List[str], pick_index: Optional[int]=None, limit_rows: Optional[int]=None) -> Dict[str, Any]:
+    """
+    - Se pick_index for None: percorre todos os links e tenta ingerir.
+    - Se pick_index >=1: pega só o N-ésimo link (ex.: 'terceira planilha' => pick_index=3).
+    """
+    # Downloads em paralelo pelo pool compartilhado; a gravação no banco segue em ordem
+    picked, dfs = await _baixar_links(links, pick_index, limit_rows)
+    return await _gravar_links(picked, dfs)
+
 async def ingest_from_doc_link(doc_url: str, pick_index: Optional[int]=None, limit_rows: Optional[int]=None) -> Dict[str, Any]:
     """
     Baixa o DOC/HTML (Google Docs ou Word publicado na web), extrai hiperlinks e segue.
     """
-    html = fetch_text(doc_url)
-    links = extract_links_from_html(html)
+    html = await fetch_text(doc_url)
+    links = await asyncio.to_thread(extract_links_from_html, html)
     return await follow_links_and_ingest(links, pick_index=pick_index, limit_rows=limit_rows)
 
 # --- NOVO: ingestão de múltiplos DOCs com hyperlinks ---
@@ -270,16 +563,155 @@ async def ingest_from_doc_links(
     Processa vários documentos (Google Docs/Word publicado na web), extrai hyperlinks
     de cada um e segue para ingestão. Retorna um resumo por documento.
     """
+    urls = list(doc_urls)
+    sem = asyncio.Semaphore(_DOCS_SIMULTANEOS)
+
+    async def _baixar_doc(url: str) -> Tuple[List[str], List[Any]]:
+        async with sem:
+            html = await fetch_text(url)
+            links = await asyncio.to_thread(extract_links_from_html, html)
+            return await _baixar_links(links, pick_index, limit_rows)
+
+    # Download e extração dos documentos em paralelo; a gravação segue documento a documento, na
+    # ordem de entrada, porque um doc pode depender de outro (pessoas -> projetos -> tarefas)
+    baixados = await asyncio.gather(*(_baixar_doc(u) for u in urls), return_exceptions=True)
     results = []
-    count = 0
-    for url in doc_urls:
-        count += 1
+    for url, baixado in zip(urls, baixados):
         try:
-            res = await ingest_from_doc_link(url, pick_index=pick_index, limit_rows=limit_rows)
+            if isinstance(baixado, Exception):
+                raise baixado
+            res = await _gravar_links(*baixado)
             results.append({"doc_url": url, "ok": True, "resultado": res})
         except Exception as e:
             results.append({"doc_url": url, "ok": False, "erro": str(e)})
     return {
-        "documentos_processados": count,
+        "documentos_processados": len(urls),
         "resultados": results
     }
+
+# ---------------------------
+# Inserção em massa via API (listas já validadas pelo FastAPI)
+# ---------------------------
+async def _buscar_ids(modelo, ids: Iterable[str]) -> Dict[str, Any]:
+    """Documentos dos ids distintos da lista num único $in; ids inválidos ficam de fora."""
+    oids = set()
+    for i in set(ids):
+        try:
+            oids.add(PydanticObjectId(i))
+        except Exception:
+            pass
+    if not oids:
+        return {}
+    return {str(doc.id): doc async for doc in modelo.find(In(modelo.id, list(oids)))}
+
+async def inserir_tarefas(dados: List[TarefaCreate]) -> Dict[str, Any]:
+    """Cria as tarefas em lotes (insert_many), validando projetos e responsáveis com uma consulta cada."""
+    errors, lote, linhas = [], [], []
+    projetos, responsaveis = await asyncio.gather(
+        _buscar_ids(Projeto, (d.projeto_id for d in dados)),
+        _buscar_ids(Funcionario, (d.responsavel_id for d in dados)),
+    )
+    for n, d in enumerate(dados, start=1):
+        projeto = projetos.get(d.projeto_id)
+        if not projeto:
+            errors.append(f"Item {n}: Projeto '{d.projeto_id}' não encontrado.")
+            continue
+        responsavel = responsaveis.get(d.responsavel_id)
+        if not responsavel:
+            errors.append(f"Item {n}: Responsável '{d.responsavel_id}' não encontrado.")
+            continue
+        tarefa = Tarefa(**d.dict(exclude={"projeto_id", "responsavel_id"}), projeto=projeto, responsavel=responsavel)
+        tarefa.sincronizar_nome_lower()  # insert_many não dispara os eventos do Beanie
+        lote.append(tarefa)
+        linhas.append(n)
+    created = await _inserir_em_lotes(Tarefa, lote, linhas, errors)
+    return {"type": "tarefas", "criados": created, "erros": errors}
+
+async def inserir_funcionarios(
+    dados: List[FuncionarioCreate], gerar_hash: Callable[[str], Awaitable[str]]
+) -> Dict[str, Any]:
+    """
+    Cria os funcionários em lotes, ignorando emails já cadastrados ou repetidos na lista.
+    Os hashes das senhas são gerados em paralelo (gerar_hash roda fora do event loop,
+    num pool limitado próprio para lotes).
+    """
+    vistos = set(await _buscar_por(Funcionario, "email", (d.email for d in dados)))
+    novos, linhas, skipped_dupes = [], [], 0
+    for n, d in enumerate(dados, start=1):
+        if d.email in vistos:
+            skipped_dupes += 1
+            continue
+        vistos.add(d.email)
+        novos.append(d)
+        linhas.append(n)
+    hashes = await asyncio.gather(*(gerar_hash(d.senha) for d in novos))
+    lote = [Funcionario(**d.dict(exclude={"senha"}), senha=h) for d, h in zip(novos, hashes)]
+    errors: List[str] = []
+    created = await _inserir_em_lotes(Funcionario, lote, linhas, errors)
+    return {"type": "funcionarios", "criados": created, "ignorados_existentes": skipped_dupes, "erros": errors}
+
+# ---------------------------
+# Ingestão em segundo plano
+# ---------------------------
+# Planilhas grandes podem levar minutos: o endpoint devolve um id na hora e o cliente
+# consulta o andamento. O job roda no worker que o recebeu, mas o estado fica no Mongo
+# (coleção com TTL de 1h), então a consulta pode cair em qualquer worker.
+_tasks_jobs: set = set()  # referência forte: o event loop só guarda referência fraca às tasks
+
+# O job em andamento grava um pulso a cada _PULSO_JOB_S; sem pulso por _JOB_PARADO_S,
+# a consulta o trata como falho (o worker que o rodava caiu ou foi reiniciado)
+_PULSO_JOB_S = 15
+_JOB_PARADO_S = 4 * _PULSO_JOB_S
+_MSG_JOB_INTERROMPIDO = "Ingestão interrompida: o servidor que a processava parou antes de terminar."
+
+async def iniciar_job(trabalho: Awaitable[Dict[str, Any]], dono: str) -> str:
+    """Registra o job, agenda a ingestão como task do event loop e retorna o id para consulta."""
+    job = JobIngestao(dono=dono)
+    try:
+        await job.insert()
+    except Exception:
+        trabalho.close()
+        raise
+
+    async def _pulsar():
+        while True:
+            await asyncio.sleep(_PULSO_JOB_S)
+            try:
+                await JobIngestao.find_one(JobIngestao.id == job.id).update(
+                    {"$set": {JobIngestao.atualizadoEm: datetime.utcnow()}}
+                )
+            except Exception as e:
+                print(f"Aviso: pulso do job de ingestão {job.id} não gravado: {e}")
+
+    async def _rodar():
+        pulso = asyncio.create_task(_pulsar())
+        try:
+            resultado, status = await trabalho, "concluido"
+        except Exception as e:
+            resultado, status = {"type": "erro", "criados": 0, "erros": [str(e)]}, "erro"
+        finally:
+            pulso.cancel()
+        try:
+            await job.set({
+                JobIngestao.status: status, JobIngestao.resultado: resultado,
+                JobIngestao.atualizadoEm: datetime.utcnow(),
+            })
+        except Exception as e:
+            # Sem o status final, o job deixa de pulsar e a consulta passa a reportá-lo como falho
+            print(f"ERRO ao gravar o resultado do job de ingestão {job.id}: {e}")
+
+    task = asyncio.create_task(_rodar())
+    _tasks_jobs.add(task)
+    task.add_done_callback(_tasks_jobs.discard)
+    return str(job.id)
+
+async def obter_job(job_id: str) -> Optional[JobIngestao]:
+    """Job pelo id; um job 'em andamento' sem pulso recente volta como 'erro'."""
+    try:
+        job = await JobIngestao.get(PydanticObjectId(job_id))
+    except Exception:
+        return None
+    if job and job.status == "em andamento" and (datetime.utcnow() - job.atualizadoEm).total_seconds() > _JOB_PARADO_S:
+        job.status = "erro"
+        job.resultado = {"type": "erro", "criados": 0, "erros": [_MSG_JOB_INTERROMPIDO]}
+    return job
@@ -1,41 +1,54 @@
 # main.py
 from fastapi import FastAPI, HTTPException, Body, Query, Depends, status, Request, UploadFile, File
 from fastapi.security import OAuth2PasswordRequestForm
-from fastapi.responses import StreamingResponse, JSONResponse
-from typing import List, Optional
-from beanie import PydanticObjectId, operators
+from fastapi.responses import StreamingResponse, ORJSONResponse, Response
+from typing import List, Optional, Any, AsyncIterable, AsyncIterator, Awaitable, Callable
+from beanie import PydanticObjectId, UpdateResponse
+from bson import DBRef
+from pymongo.errors import DuplicateKeyError
 from contextlib import asynccontextmanager
 from datetime import date, datetime
-from jose import JWTError, jwt
 from fastapi.middleware.cors import CORSMiddleware
 import pandas as pd
 import io
+import asyncio
+from cachetools import TTLCache
+from pydantic import TypeAdapter
 
 # Importa a lógica de autenticação, IA e os modelos
 import auth
-from ia_generativa import inicializar_ia, gerar_resposta_ia
+from ia_generativa import inicializar_ia, aquecer_ia, gerar_resposta_ia, gerar_resposta_ia_stream
 from database import db
 from models import (
     Funcionario, Projeto, Tarefa, Calendario, Token,
     FuncionarioCreate, ProjetoCreate, TarefaCreate, CalendarioCreate,
     FuncionarioUpdate, ProjetoUpdate, TarefaUpdate, CalendarioUpdate,
     StatusTarefa, PrioridadeTarefa, TokenData,
-    ChatRequest, AIResponse
+    ChatRequest, AIResponse, FuncionarioPublico, ProjetoResumo, TarefaResumo, CalendarioResumo, ProjetoNome, TarefaContexto, FuncionarioContexto
 )
 
 # NOVOS módulos
-from ingest import ingest_file, ingest_from_doc_link, ingest_from_doc_links
-from command_router import handle_command
+from ingest import (
+    ingest_file, ingest_from_doc_link, ingest_from_doc_links, abrir_http, fechar_http,
+    iniciar_job, obter_job,
+    inserir_tarefas, inserir_funcionarios,
+)
+from command_router import handle_command, invalidar_documento
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Inicializa a conexão com o banco de dados
-    await db.initialize()
-    inicializar_ia()
-    yield
+    # Inicializa a conexão com o banco de dados (fechada ao encerrar a aplicação)
+    async with db:
+        inicializar_ia()
+        await aquecer_ia()
+        abrir_http()
+        yield
+        await fechar_http()
 
 app = FastAPI(
     lifespan=lifespan,
+    # orjson (C) no lugar do json.dumps da stdlib para todas as respostas JSON
+    default_response_class=ORJSONResponse,
     title="API de Gerenciamento de Projetos e Tarefas",
     description="API com CRUD completo, autenticação e IA Generativa.",
     version="9.1.0"  # IA + comandos + ingestão universal + múltiplos links
@@ -51,16 +64,20 @@ app.add_middleware(
 )
 
 # --- LÓGICA CENTRAL DA IA ---
-async def obter_resposta_ia(pergunta: str, current_user: Funcionario) -> AIResponse:
+async def montar_contexto_ia(current_user: Funcionario) -> str:
     nome_usuario = current_user.nome
 
     # 1. Coletar contexto
-    projetos_usuario = await Projeto.find(Projeto.responsavel.id == current_user.id).to_list()
-    tarefas_pendentes = await Tarefa.find(
-        Tarefa.responsavel.id == current_user.id,
-        Tarefa.status != StatusTarefa.CONCLUIDA
-    ).sort(+Tarefa.prazo).to_list()
-    todos_funcionarios = await Funcionario.find_all().to_list()
+    # Consultas independentes e projetadas: o Mongo devolve só os campos usados no texto
+    projetos_usuario, tarefas_pendentes, todos_funcionarios = await asyncio.gather(
+        Projeto.find(Projeto.responsavel.id == current_user.id, projection_model=ProjetoNome).to_list(),
+        Tarefa.find(
+            Tarefa.responsavel.id == current_user.id,
+            Tarefa.status != StatusTarefa.CONCLUIDA,
+            projection_model=TarefaContexto,
+        ).sort(+Tarefa.prazo).to_list(),
+        Funcionario.find_all(projection_model=FuncionarioContexto).to_list(),
+    )
 
     # 2. Montar contexto
     contexto_formatado = f"**Dados do usuário logado ({nome_usuario}):**\n"
@@ -85,6 +102,12 @@ async def obter_resposta_ia(pergunta: str, current_user: Funcionario) -> AIRespo
     else:
         contexto_formatado += "Nenhum funcionário cadastrado."
 
+    return contexto_formatado
+
+async def obter_resposta_ia(pergunta: str, current_user: Funcionario) -> AIResponse:
+    nome_usuario = current_user.nome
+    contexto_formatado = await montar_contexto_ia(current_user)
+
     # 3. Chamar IA
     texto_gerado_pela_ia = await gerar_resposta_ia(
         contexto=contexto_formatado,
@@ -101,8 +124,8 @@ async def obter_resposta_ia(pergunta: str, current_user: Funcionario) -> AIRespo
 # --- AUTENTICAÇÃO ---
 @app.post("/token", response_model=Token, tags=["Autenticação"])
 async def login_para_obter_token(form_data: OAuth2PasswordRequestForm = Depends()):
-    funcionario = await Funcionario.find_one(Funcionario.email == form_data.username)
-    if not funcionario or not auth.verificar_senha(form_data.password, funcionario.senha):
+    funcionario = await auth.autenticar_funcionario(form_data.username, form_data.password)
+    if not funcionario:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Email ou senha incorretos")
     token_acesso = auth.criar_token_acesso(data={"sub": funcionario.email})
     return {"access_token": token_acesso, "token_type": "bearer"}
@@ -114,7 +137,7 @@ async def processar_chat_ia(
     current_user: Funcionario = Depends(auth.get_usuario_logado)
 ):
     # 1) Tenta executar um comando (ação direta)
-    cmd_result = await handle_command(chat_request.pergunta)
+    cmd_result = await _executar_comando(chat_request.pergunta)
     if cmd_result:
         msg_cmd = cmd_result["mensagem"]
         ai = await obter_resposta_ia(f"{chat_request.pergunta}\n\nResumo: {msg_cmd}", current_user)
@@ -125,41 +148,184 @@ async def processar_chat_ia(
     # 2) Caso contrário, apenas IA
     return await obter_resposta_ia(chat_request.pergunta, current_user)
 
+def _evento_sse(texto: str) -> str:
+    # Cada linha do texto vira uma linha 'data:'; a linha em branco fecha o evento
+    return "".join(f"data: {linha}\n" for linha in texto.split("\n")) + "\n"
+
+@app.post("/ai/chat/stream", tags=["IA Generativa"], summary="Igual ao /ai/chat, mas envia a resposta da IA em pedaços (text/event-stream).")
+async def processar_chat_ia_stream(
+    chat_request: ChatRequest,
+    current_user: Funcionario = Depends(auth.get_usuario_logado)
+):
+    pergunta = chat_request.pergunta
+    cmd_result = await _executar_comando(pergunta)
+    if cmd_result:
+        pergunta = f"{pergunta}\n\nResumo: {cmd_result['mensagem']}"
+    contexto = await montar_contexto_ia(current_user)
+
+    async def eventos():
+        if cmd_result:
+            yield _evento_sse(f"{cmd_result['mensagem']}\n\n")
+        async for pedaco in gerar_resposta_ia_stream(contexto, pergunta, current_user.nome):
+            yield _evento_sse(pedaco)
+
+    return StreamingResponse(eventos(), media_type="text/event-stream")
+
+# --- Cache das leituras (GET) de funcionários e de um projeto ---
+# Corpo JSON já serializado, por namespace; escritas limpam o namespace inteiro.
+# O cache é por processo: a limpeza só vale no worker que fez a escrita, então os
+# demais podem servir dados de até _TTL_LEITURAS segundos atrás. Por isso só entram
+# leituras de dados que mudam pouco; a lista de projetos (alterada também pelos
+# comandos do chat) não é cacheada.
+_TTL_LEITURAS = 5
+_cache_leituras: TTLCache = TTLCache(maxsize=1024, ttl=_TTL_LEITURAS)
+_JSON_FUNCIONARIO = TypeAdapter(FuncionarioPublico)
+_JSON_FUNCIONARIOS = TypeAdapter(List[FuncionarioPublico])
+_JSON_PROJETO = TypeAdapter(ProjetoResumo)
+
+async def _leitura_em_cache(namespace: str, chave: str, carregar: Callable[[], Awaitable[Any]], adaptador: TypeAdapter) -> Optional[Response]:
+    """Devolve o JSON em cache ou carrega, serializa e guarda; None se carregar() não encontrar nada."""
+    corpo = _cache_leituras.get((namespace, chave))
+    if corpo is None:
+        dados = await carregar()
+        if dados is None:
+            return None
+        corpo = adaptador.dump_json(dados, by_alias=True)
+        _cache_leituras[(namespace, chave)] = corpo
+    return Response(corpo, media_type="application/json")
+
+def _invalidar_leituras(*namespaces: str) -> None:
+    for chave in [k for k in list(_cache_leituras) if k[0] in namespaces]:
+        _cache_leituras.pop(chave, None)
+
+async def _executar_comando(pergunta: str) -> Optional[dict]:
+    """handle_command + limpeza das leituras em cache quando o comando alterou dados."""
+    cmd_result = await handle_command(pergunta)
+    if cmd_result and cmd_result.get("executado"):
+        _invalidar_leituras("projetos")
+    return cmd_result
+
+# --- Listas grandes sem cache: JSON enviado à medida que o cursor avança ---
+_JSON_TAREFA_RESUMO = TypeAdapter(TarefaResumo)
+_JSON_CALENDARIO_RESUMO = TypeAdapter(CalendarioResumo)
+_TAMANHO_PEDACO = 64 * 1024
+
+async def _array_json(buffer: bytearray, docs: AsyncIterator[Any], adaptador: TypeAdapter) -> AsyncIterator[bytes]:
+    """Continua o array JSON iniciado em buffer, documento a documento, em pedaços de ~64 KiB."""
+    separador = b"," if len(buffer) > 1 else b""
+    try:
+        async for doc in docs:
+            buffer += separador
+            buffer += adaptador.dump_json(doc, by_alias=True)
+            separador = b","
+            if len(buffer) >= _TAMANHO_PEDACO:
+                yield bytes(buffer)
+                buffer.clear()
+    except Exception as e:
+        # Status e cabeçalhos já foram enviados: registra e aborta a conexão, para o
+        # cliente não receber um 200 com um array truncado como se estivesse completo
+        print(f"Erro ao enviar lista em fluxo (resposta interrompida): {e!r}")
+        raise
+    buffer += b"]"
+    yield bytes(buffer)
+
+async def _lista_em_fluxo(docs: AsyncIterable[Any], adaptador: TypeAdapter) -> StreamingResponse:
+    """
+    Lê e serializa o primeiro documento antes de montar a resposta: falhas da consulta
+    (e do primeiro lote do cursor) ainda viram um 500 normal, não um 200 truncado.
+    """
+    cursor = aiter(docs)
+    buffer = bytearray(b"[")
+    primeiro = await anext(cursor, None)
+    if primeiro is not None:
+        buffer += adaptador.dump_json(primeiro, by_alias=True)
+    return StreamingResponse(_array_json(buffer, cursor, adaptador), media_type="application/json")
+
 # --- CRUDs (existentes) ---
-@app.post("/funcionarios", response_model=Funcionario, tags=["Funcionários"])
+# Buscas independentes (documento + referências) vão juntas num asyncio.gather, em vez de
+# uma ida ao banco depois da outra.
+async def _buscar_por_id(modelo, id: Optional[str], **kwargs):
+    """Documento pelo id em texto, ou None sem consultar o banco se não houver id."""
+    return await modelo.get(PydanticObjectId(id), **kwargs) if id else None
+
+async def _atualizar_campos(modelo, id: PydanticObjectId, campos: dict):
+    """
+    Grava só os campos enviados num único $set (find_one_and_update) e devolve o documento
+    como estava antes, ou None se não existir. Não dispara os eventos do Beanie.
+    """
+    if not campos:
+        return await modelo.get(id)
+    return await modelo.find_one(modelo.id == id).update(
+        {"$set": campos}, response_type=UpdateResponse.OLD_DOCUMENT
+    )
+
+def _ref(doc) -> Optional[DBRef]:
+    """Valor gravado num campo Link (DBRef), para uso em $set."""
+    return DBRef(type(doc).get_collection_name(), doc.id) if doc is not None else None
+
+def _mesclar(antes, campos: dict):
+    """Documento como ficou após o $set, montado em memória a partir do anterior (sem reler do banco)."""
+    return antes.model_copy(update=campos)
+
+@app.post("/funcionarios", response_model=FuncionarioPublico, tags=["Funcionários"])
 async def criar_funcionario(funcionario_data: FuncionarioCreate):
     if await Funcionario.find_one(Funcionario.email == funcionario_data.email):
         raise HTTPException(status_code=400, detail="Um funcionário com este email já existe.")
-    senha_hashed = auth.gerar_hash_senha(funcionario_data.senha)
+    senha_hashed = await auth.gerar_hash_senha_async(funcionario_data.senha)
     funcionario_dict = funcionario_data.dict(exclude={"senha"})
     funcionario = Funcionario(**funcionario_dict, senha=senha_hashed)
-    await funcionario.insert()
+    try:
+        await funcionario.insert()
+    except DuplicateKeyError:
+        # Cadastro concorrente com o mesmo email passou pela checagem acima; o índice único barra
+        raise HTTPException(status_code=400, detail="Um funcionário com este email já existe.")
+    _invalidar_leituras("funcionarios")
     return funcionario
 
-@app.get("/funcionarios/me", response_model=Funcionario, tags=["Funcionários"])
+# Listas maiores devem ir pela ingestão de planilhas (/ingest/arquivo/async)
+_MAX_ITENS_BULK = 1000
+
+def _validar_tamanho_bulk(itens: list) -> None:
+    if not itens or len(itens) > _MAX_ITENS_BULK:
+        raise HTTPException(status_code=400, detail=f"Envie entre 1 e {_MAX_ITENS_BULK} itens.")
+
+@app.post("/funcionarios/bulk", tags=["Funcionários"], summary="Cria vários funcionários de uma vez (emails já existentes são ignorados)")
+async def criar_funcionarios_em_massa(funcionarios_data: List[FuncionarioCreate], current_user: Funcionario = Depends(auth.get_usuario_logado)):
+    _validar_tamanho_bulk(funcionarios_data)
+    result = await inserir_funcionarios(funcionarios_data, auth.gerar_hash_senha_lote)
+    _invalidar_leituras("funcionarios")
+    return ORJSONResponse(result)
+
+@app.get("/funcionarios/me", response_model=FuncionarioPublico, tags=["Funcionários"])
 async def ler_usuario_logado(current_user: Funcionario = Depends(auth.get_usuario_logado)):
     return current_user
 
-@app.get("/funcionarios", response_model=List[Funcionario], tags=["Funcionários"])
+@app.get("/funcionarios", response_model=List[FuncionarioPublico], tags=["Funcionários"])
 async def listar_funcionarios(current_user: Funcionario = Depends(auth.get_usuario_logado)):
-    return await Funcionario.find_all().to_list()
+    return await _leitura_em_cache("funcionarios", "*", lambda: Funcionario.find_all(projection_model=FuncionarioPublico).to_list(), _JSON_FUNCIONARIOS)
+
+async def _carregar_funcionario_publico(id: PydanticObjectId) -> Optional[FuncionarioPublico]:
+    # Projeção no Mongo: o hash da senha nem sai do banco
+    return await Funcionario.find_one(Funcionario.id == id, projection_model=FuncionarioPublico)
 
-@app.get("/funcionarios/{id}", response_model=Funcionario, tags=["Funcionários"])
+@app.get("/funcionarios/{id}", response_model=FuncionarioPublico, tags=["Funcionários"])
 async def obter_funcionario(id: PydanticObjectId, current_user: Funcionario = Depends(auth.get_usuario_logado)):
-    funcionario = await Funcionario.get(id)
-    if not funcionario:
+    resposta = await _leitura_em_cache("funcionarios", str(id), lambda: _carregar_funcionario_publico(id), _JSON_FUNCIONARIO)
+    if resposta is None:
         raise HTTPException(status_code=404, detail="Funcionário não encontrado.")
-    return funcionario
+    return resposta
 
-@app.put("/funcionarios/{id}", response_model=Funcionario, tags=["Funcionários"])
+@app.put("/funcionarios/{id}", response_model=FuncionarioPublico, tags=["Funcionários"])
 async def atualizar_funcionario(id: PydanticObjectId, update_data: FuncionarioUpdate, current_user: Funcionario = Depends(auth.get_usuario_logado)):
-    funcionario = await Funcionario.get(id)
-    if not funcionario:
-        raise HTTPException(status_code=404, detail="Funcionário não encontrado.")
     update_data_dict = update_data.dict(exclude_unset=True)
-    for key, value in update_data_dict.items():
-        setattr(funcionario, key, value)
-    await funcionario.save()
+    antes = await _atualizar_campos(Funcionario, id, update_data_dict)
+    if not antes:
+        raise HTTPException(status_code=404, detail="Funcionário não encontrado.")
+    funcionario = _mesclar(antes, update_data_dict)
+    auth.invalidar_usuario(antes.email)
+    auth.invalidar_usuario(funcionario.email)
+    invalidar_documento(id)
+    _invalidar_leituras("funcionarios", "projetos")  # projetos embutem o responsável
     return funcionario
 
 @app.delete("/funcionarios/{id}", status_code=204, tags=["Funcionários"])
@@ -168,6 +334,9 @@ async def deletar_funcionario(id: PydanticObjectId, current_user: Funcionario =
     if not funcionario:
         raise HTTPException(status_code=404, detail="Funcionário não encontrado.")
     await funcionario.delete()
+    auth.invalidar_usuario(funcionario.email)
+    invalidar_documento(id)
+    _invalidar_leituras("funcionarios", "projetos")
     return None
 
 @app.post("/projetos", response_model=Projeto, tags=["Projetos"])
@@ -177,34 +346,42 @@ async def criar_projeto(projeto_data: ProjetoCreate, current_user: Funcionario =
         raise HTTPException(status_code=404, detail="Funcionário responsável não encontrado.")
     projeto = Projeto(**projeto_data.dict(exclude={"responsavel_id"}), responsavel=responsavel)
     await projeto.insert()
+    _invalidar_leituras("projetos")
     return projeto
 
-@app.get("/projetos", response_model=List[Projeto], tags=["Projetos"])
+@app.get("/projetos", response_model=List[ProjetoResumo], tags=["Projetos"])
 async def listar_projetos(current_user: Funcionario = Depends(auth.get_usuario_logado)):
-    return await Projeto.find_all(fetch_links=True).to_list()
+    return await _lista_em_fluxo(Projeto.listar_com_responsavel(), _JSON_PROJETO)
 
-@app.get("/projetos/{id}", response_model=Projeto, tags=["Projetos"])
+async def _carregar_projeto_resumo(id: PydanticObjectId) -> Optional[ProjetoResumo]:
+    encontrados = await Projeto.listar_com_responsavel({"_id": id}).to_list()
+    return encontrados[0] if encontrados else None
+
+@app.get("/projetos/{id}", response_model=ProjetoResumo, tags=["Projetos"])
 async def obter_projeto(id: PydanticObjectId, current_user: Funcionario = Depends(auth.get_usuario_logado)):
-    projeto = await Projeto.get(id, fetch_links=True)
-    if not projeto:
+    resposta = await _leitura_em_cache("projetos", str(id), lambda: _carregar_projeto_resumo(id), _JSON_PROJETO)
+    if resposta is None:
         raise HTTPException(status_code=404, detail="Projeto não encontrado.")
-    return projeto
+    return resposta
 
 @app.put("/projetos/{id}", response_model=Projeto, tags=["Projetos"])
 async def atualizar_projeto(id: PydanticObjectId, update_data: ProjetoUpdate, current_user: Funcionario = Depends(auth.get_usuario_logado)):
-    projeto = await Projeto.get(id, fetch_links=True)
-    if not projeto:
-        raise HTTPException(status_code=404, detail="Projeto não encontrado.")
     update_data_dict = update_data.dict(exclude_unset=True)
-    if "responsavel_id" in update_data_dict:
-        novo_responsavel = await Funcionario.get(PydanticObjectId(update_data_dict["responsavel_id"]))
+    novo_responsavel_id = update_data_dict.pop("responsavel_id", None)
+    if novo_responsavel_id:
+        novo_responsavel = await Funcionario.get(PydanticObjectId(novo_responsavel_id))
         if not novo_responsavel:
             raise HTTPException(status_code=404, detail="Novo funcionário responsável não encontrado.")
-        projeto.responsavel = novo_responsavel
-        del update_data_dict["responsavel_id"]
-    for key, value in update_data_dict.items():
-        setattr(projeto, key, value)
-    await projeto.save()
+        update_data_dict["responsavel"] = _ref(novo_responsavel)
+    if update_data_dict.get("nome"):
+        update_data_dict["nome_lower"] = update_data_dict["nome"].casefold().strip()
+    antes = await _atualizar_campos(Projeto, id, update_data_dict)
+    if not antes:
+        raise HTTPException(status_code=404, detail="Projeto não encontrado.")
+    invalidar_documento(id)
+    _invalidar_leituras("projetos")
+    # Releitura com os links carregados: a resposta mantém o mesmo formato de antes,
+    # com o responsável embutido, qualquer que seja o campo alterado
     return await Projeto.get(id, fetch_links=True)
 
 @app.delete("/projetos/{id}", status_code=204, tags=["Projetos"])
@@ -213,20 +390,29 @@ async def deletar_projeto(id: PydanticObjectId, current_user: Funcionario = Depe
     if not projeto:
         raise HTTPException(status_code=404, detail="Projeto não encontrado.")
     await projeto.delete()
+    invalidar_documento(id)
+    _invalidar_leituras("projetos")
     return None
 
 @app.post("/tarefas", response_model=Tarefa, tags=["Tarefas"])
 async def criar_tarefa(tarefa_data: TarefaCreate, current_user: Funcionario = Depends(auth.get_usuario_logado)):
-    projeto = await Projeto.get(PydanticObjectId(tarefa_data.projeto_id))
+    projeto, responsavel = await asyncio.gather(
+        Projeto.get(PydanticObjectId(tarefa_data.projeto_id)),
+        Funcionario.get(PydanticObjectId(tarefa_data.responsavel_id)),
+    )
     if not projeto: raise HTTPException(status_code=404, detail="Projeto não encontrado.")
-    responsavel = await Funcionario.get(PydanticObjectId(tarefa_data.responsavel_id))
     if not responsavel: raise HTTPException(status_code=404, detail="Funcionário responsável não encontrado.")
     tarefa_dict = tarefa_data.dict(exclude={"projeto_id", "responsavel_id"})
     tarefa = Tarefa(**tarefa_dict, projeto=projeto, responsavel=responsavel)
     await tarefa.insert()
     return tarefa
 
-@app.get("/tarefas", response_model=List[Tarefa], tags=["Tarefas"])
+@app.post("/tarefas/bulk", tags=["Tarefas"], summary="Cria várias tarefas de uma vez; itens com projeto/responsável inexistente voltam em 'erros'")
+async def criar_tarefas_em_massa(tarefas_data: List[TarefaCreate], current_user: Funcionario = Depends(auth.get_usuario_logado)):
+    _validar_tamanho_bulk(tarefas_data)
+    return ORJSONResponse(await inserir_tarefas(tarefas_data))
+
+@app.get("/tarefas", response_model=List[TarefaResumo], tags=["Tarefas"])
 async def listar_tarefas_filtradas(
     departamento: Optional[str] = Query(None, description="Filtrar por departamento do responsável"),
     projeto_id: Optional[PydanticObjectId] = Query(None, description="Filtrar por ID do projeto"),
@@ -234,18 +420,13 @@ async def listar_tarefas_filtradas(
     urgencia: Optional[bool] = Query(False, description="Ordenar tarefas por urgência"),
     current_user: Funcionario = Depends(auth.get_usuario_logado)
 ):
-    query_conditions = []
-    if responsavel_id: query_conditions.append(Tarefa.responsavel.id == responsavel_id)
-    if projeto_id: query_conditions.append(Tarefa.projeto.id == projeto_id)
-    if departamento:
-        funcionarios_no_dpto = await Funcionario.find(Funcionario.departamento == departamento).to_list()
-        ids_funcionarios = [f.id for f in funcionarios_no_dpto]
-        if not ids_funcionarios: return []
-        query_conditions.append(operators.In(Tarefa.responsavel.id, ids_funcionarios))
-    sort_expression = []
-    if urgencia: sort_expression.extend([("prazo", 1), ("prioridade", -1)])
-    tarefas = await Tarefa.find(*query_conditions, fetch_links=True).sort(*sort_expression).to_list()
-    return tarefas
+    filtro = {}
+    if responsavel_id: filtro["responsavel.$id"] = responsavel_id
+    if projeto_id: filtro["projeto.$id"] = projeto_id
+    ordenacao = {"prazo": 1, "prioridade": -1} if urgencia else None
+    # Responsável e projeto vêm por $lookup no mesmo aggregate; o departamento é filtrado ali mesmo
+    tarefas = Tarefa.listar_com_links(filtro, departamento=departamento, ordenacao=ordenacao)
+    return await _lista_em_fluxo(tarefas, _JSON_TAREFA_RESUMO)
 
 @app.get("/tarefas/{id}", response_model=Tarefa, tags=["Tarefas"])
 async def obter_tarefa(id: PydanticObjectId, current_user: Funcionario = Depends(auth.get_usuario_logado)):
@@ -256,20 +437,20 @@ async def obter_tarefa(id: PydanticObjectId, current_user: Funcionario = Depends
 
 @app.put("/tarefas/{id}", response_model=Tarefa, tags=["Tarefas"])
 async def atualizar_tarefa(id: PydanticObjectId, update_data: TarefaUpdate, current_user: Funcionario = Depends(auth.get_usuario_logado)):
-    tarefa = await Tarefa.get(id, fetch_links=True)
-    if not tarefa:
-        raise HTTPException(status_code=404, detail="Tarefa não encontrada.")
     update_data_dict = update_data.dict(exclude_unset=True)
-    if "responsavel_id" in update_data_dict:
-        novo_responsavel = await Funcionario.get(PydanticObjectId(update_data_dict["responsavel_id"]))
+    novo_responsavel_id = update_data_dict.pop("responsavel_id", None)
+    if novo_responsavel_id:
+        novo_responsavel = await Funcionario.get(PydanticObjectId(novo_responsavel_id))
         if not novo_responsavel: raise HTTPException(status_code=404, detail="Novo funcionário responsável não encontrado.")
-        tarefa.responsavel = novo_responsavel
-        del update_data_dict["responsavel_id"]
+        update_data_dict["responsavel"] = _ref(novo_responsavel)
     if "status" in update_data_dict and update_data_dict["status"] == StatusTarefa.CONCLUIDA:
-        tarefa.dataConclusao = date.today()
-    for key, value in update_data_dict.items():
-        setattr(tarefa, key, value)
-    await tarefa.save()
+        update_data_dict["dataConclusao"] = date.today()
+    if update_data_dict.get("nome"):
+        update_data_dict["nome_lower"] = update_data_dict["nome"].casefold().strip()
+    antes = await _atualizar_campos(Tarefa, id, update_data_dict)
+    if not antes:
+        raise HTTPException(status_code=404, detail="Tarefa não encontrada.")
+    invalidar_documento(id)
     return await Tarefa.get(id, fetch_links=True)
 
 @app.delete("/tarefas/{id}", status_code=204, tags=["Tarefas"])
@@ -278,25 +459,26 @@ async def deletar_tarefa(id: PydanticObjectId, current_user: Funcionario = Depen
     if not tarefa:
         raise HTTPException(status_code=404, detail="Tarefa não encontrada.")
     await tarefa.delete()
+    invalidar_documento(id)
     return None
 
 # --- Calendário (existente) ---
 @app.post("/calendario", response_model=Calendario, tags=["Calendário"])
 async def criar_evento_calendario(calendario_data: CalendarioCreate, current_user: Funcionario = Depends(auth.get_usuario_logado)):
-    projeto_link = tarefa_link = None
-    if calendario_data.projeto_id:
-        projeto_link = await Projeto.get(PydanticObjectId(calendario_data.projeto_id))
-        if not projeto_link: raise HTTPException(status_code=404, detail="Projeto para agendamento não encontrado.")
-    if calendario_data.tarefa_id:
-        tarefa_link = await Tarefa.get(PydanticObjectId(calendario_data.tarefa_id))
-        if not tarefa_link: raise HTTPException(status_code=404, detail="Tarefa para agendamento não encontrada.")
+    projeto_link, tarefa_link = await asyncio.gather(
+        _buscar_por_id(Projeto, calendario_data.projeto_id),
+        _buscar_por_id(Tarefa, calendario_data.tarefa_id),
+    )
+    if calendario_data.projeto_id and not projeto_link: raise HTTPException(status_code=404, detail="Projeto para agendamento não encontrado.")
+    if calendario_data.tarefa_id and not tarefa_link: raise HTTPException(status_code=404, detail="Tarefa para agendamento não encontrada.")
     evento = Calendario(**calendario_data.dict(exclude={"projeto_id", "tarefa_id"}), projeto=projeto_link, tarefa=tarefa_link)
     await evento.insert()
     return evento
 
-@app.get("/calendario", response_model=List[Calendario], tags=["Calendário"])
+@app.get("/calendario", response_model=List[CalendarioResumo], tags=["Calendário"])
 async def listar_eventos_calendario(current_user: Funcionario = Depends(auth.get_usuario_logado)):
-    return await Calendario.find_all(fetch_links=True).to_list()
+    # Projeto, responsável e tarefa vêm por $lookup no mesmo aggregate, já sem a senha
+    return await _lista_em_fluxo(Calendario.listar_com_links(), _JSON_CALENDARIO_RESUMO)
 
 @app.get("/calendario/{id}", response_model=Calendario, tags=["Calendário"])
 async def obter_evento_calendario(id: PydanticObjectId, current_user: Funcionario = Depends(auth.get_usuario_logado)):
@@ -307,18 +489,19 @@ async def obter_evento_calendario(id: PydanticObjectId, current_user: Funcionari
 
 @app.put("/calendario/{id}", response_model=Calendario, tags=["Calendário"])
 async def atualizar_evento_calendario(id: PydanticObjectId, update_data: CalendarioUpdate, current_user: Funcionario = Depends(auth.get_usuario_logado)):
-    evento = await Calendario.get(id)
-    if not evento:
-        raise HTTPException(status_code=404, detail="Evento do calendário não encontrado.")
     update_dict = update_data.dict(exclude_unset=True)
-    if "projeto_id" in update_dict:
-        evento.projeto = await Projeto.get(PydanticObjectId(update_dict["projeto_id"])) if update_dict["projeto_id"] else None
-    if "tarefa_id" in update_dict:
-        evento.tarefa = await Tarefa.get(PydanticObjectId(update_dict["tarefa_id"])) if update_dict["tarefa_id"] else None
-    for key, value in update_dict.items():
-        if key not in ["projeto_id", "tarefa_id"]:
-            setattr(evento, key, value)
-    await evento.save()
+    # projeto_id/tarefa_id enviados (mesmo nulos) substituem o link; id inexistente vira None
+    links = {campo: update_dict.pop(f"{campo}_id") for campo in ("projeto", "tarefa") if f"{campo}_id" in update_dict}
+    projeto_link, tarefa_link = await asyncio.gather(
+        _buscar_por_id(Projeto, links.get("projeto")),
+        _buscar_por_id(Tarefa, links.get("tarefa")),
+    )
+    if "projeto" in links:
+        update_dict["projeto"] = _ref(projeto_link)
+    if "tarefa" in links:
+        update_dict["tarefa"] = _ref(tarefa_link)
+    if not await _atualizar_campos(Calendario, id, update_dict):
+        raise HTTPException(status_code=404, detail="Evento do calendário não encontrado.")
     return await Calendario.get(id, fetch_links=True)
 
 @app.delete("/calendario/{id}", status_code=204, tags=["Calendário"])
@@ -365,7 +548,19 @@ async def exportar_tarefas_excel(current_user: Funcionario = Depends(auth.get_us
 async def ingest_arquivo(file: UploadFile = File(...), current_user: Funcionario = Depends(auth.get_usuario_logado)):
     contents = await file.read()
     result = await ingest_file(file.filename, contents)
-    return JSONResponse(result)
+    _invalidar_leituras("funcionarios", "projetos")
+    return ORJSONResponse(result)
+
+async def _ingerir_arquivo(filename: str, contents: bytes) -> dict:
+    result = await ingest_file(filename, contents)
+    _invalidar_leituras("funcionarios", "projetos")
+    return result
+
+@app.post("/ingest/arquivo/async", status_code=202, tags=["Ingestão"], summary="Mesmo que /ingest/arquivo, mas em segundo plano; consulte o resultado em /ingest/jobs/{job_id}")
+async def ingest_arquivo_async(file: UploadFile = File(...), current_user: Funcionario = Depends(auth.get_usuario_logado)):
+    contents = await file.read()
+    job_id = await iniciar_job(_ingerir_arquivo(file.filename, contents), dono=current_user.email)
+    return ORJSONResponse({"job_id": job_id, "status": "em andamento"}, status_code=202)
 
 @app.post("/ingest/link", tags=["Ingestão"], summary="Um DOC (Google Docs/Word publicado) com hyperlinks para Sheets/Excel/CSV")
 async def ingest_link(
@@ -375,7 +570,8 @@ async def ingest_link(
     current_user: Funcionario = Depends(auth.get_usuario_logado)
 ):
     result = await ingest_from_doc_link(url, pick_index=pegar_indice, limit_rows=limitar_linhas)
-    return JSONResponse(result)
+    _invalidar_leituras("funcionarios", "projetos")
+    return ORJSONResponse(result)
 
 @app.post(
     "/ingest/links",
@@ -406,38 +602,44 @@ async def ingest_links(
     pegar_indice = payload.get("pegar_indice")
     limitar_linhas = payload.get("limitar_linhas")
     result = await ingest_from_doc_links(urls, pick_index=pegar_indice, limit_rows=limitar_linhas)
-    return JSONResponse(result)
+    _invalidar_leituras("funcionarios", "projetos")
+    return ORJSONResponse(result)
+
+@app.get("/ingest/jobs/{job_id}", tags=["Ingestão"], summary="Andamento e resultado de uma ingestão em segundo plano")
+async def consultar_job_ingestao(job_id: str, current_user: Funcionario = Depends(auth.get_usuario_logado)):
+    job = await obter_job(job_id)
+    if not job or job.dono != current_user.email:
+        raise HTTPException(status_code=404, detail="Job de ingestão não encontrado.")
+    return ORJSONResponse({"job_id": str(job.id), "status": job.status, "resultado": job.resultado})
 
 # --- Webhook (Dialogflow) ---
+def _deep_get(d: Any, *chaves: str, default: Any = None) -> Any:
+    """Lê um caminho de chaves aninhadas sem criar dicts vazios intermediários."""
+    for chave in chaves:
+        if not isinstance(d, dict):
+            return default
+        d = d.get(chave)
+    return default if d is None else d
+
+def _resposta_webhook(*mensagens: dict) -> dict:
+    return {"fulfillment_response": {"messages": list(mensagens)}}
+
+_RESPOSTA_SESSAO_INVALIDA = _resposta_webhook({"text": {"text": ["Sessão inválida. Por favor, faça login novamente."]}})
+
 @app.post("/webhook", tags=["Dialogflow"])
 async def dialogflow_webhook(request: Request):
     payload = await request.json()
-    pergunta = payload.get("text") or payload.get("sessionInfo", {}).get("parameters", {}).get("pergunta", "pergunta não encontrada")
-    token = payload.get("sessionInfo", {}).get("parameters", {}).get("token")
-    usuario_logado = None
-    if token:
-        try:
-            payload_token = jwt.decode(token, auth.SECRET_KEY, algorithms=[auth.ALGORITHM])
-            email = payload_token.get("sub")
-            if email:
-                usuario_logado = await Funcionario.find_one(Funcionario.email == email)
-        except JWTError:
-            pass
+    parametros = _deep_get(payload, "sessionInfo", "parameters", default={})
+    pergunta = payload.get("text") or parametros.get("pergunta", "pergunta não encontrada")
+    token = parametros.get("token")
+    usuario_logado = await auth.obter_usuario_por_token(token) if token else None
     if not usuario_logado:
-        return {"fulfillment_response": {"messages": [{"text": {"text": ["Sessão inválida. Por favor, faça login novamente."]}}]}}
-    cmd_result = await handle_command(pergunta)
+        return _RESPOSTA_SESSAO_INVALIDA
+    cmd_result = await _executar_comando(pergunta)
     if cmd_result:
         ai = await obter_resposta_ia(pergunta, usuario_logado)
         texto = f"{cmd_result['mensagem']}\n\n{ai.conteudo_texto}"
     else:
         ai = await obter_resposta_ia(pergunta, usuario_logado)
         texto = ai.conteudo_texto
-    response_json = {
-        "fulfillment_response": {
-            "messages": [
-                {"text": {"text": [texto]}},
-                {"payload": ai.dict()}
-            ]
-        }
-    }
-    return response_json
+    return _resposta_webhook({"text": {"text": [texto]}}, {"payload": ai.dict()})
@@ -1,8 +1,9 @@
 # models.py
 from datetime import datetime, date
 from typing import Optional, List, Any, Dict
-from beanie import Document, Link
-from pydantic import BaseModel, EmailStr, Field
+from beanie import Document, Link, PydanticObjectId, before_event, Insert, Replace, Save, SaveChanges
+from pydantic import BaseModel, ConfigDict, EmailStr, Field
+from pymongo import IndexModel, ASCENDING, DESCENDING
 from enum import Enum
 
 class StatusTarefa(str, Enum):
@@ -16,6 +17,9 @@ class PrioridadeTarefa(str, Enum):
     MEDIA = "média"
     ALTA = "alta"
 
+# Collation para comparar nomes sem diferenciar maiúsculas (strength 2 mantém acentos)
+COLACAO_PT = {"locale": "pt", "strength": 2}
+
 class Funcionario(Document):
     nome: str
     sobrenome: str
@@ -28,6 +32,12 @@ class Funcionario(Document):
 
     class Settings:
         name = "funcionarios"
+        # O índice único de email é criado à parte (database.garantir_indice_email), pois
+        # bases antigas podem ter emails repetidos e a falha não deve impedir o startup
+        indexes = [
+            # Busca exata por nome (comandos do chat) com a mesma collation da consulta
+            IndexModel([("nome", ASCENDING), ("sobrenome", ASCENDING)], collation=COLACAO_PT),
+        ]
 
 class Projeto(Document):
     nome: str
@@ -36,9 +46,34 @@ class Projeto(Document):
     situacao: str
     prazo: date
     responsavel: Link[Funcionario]
+    # Cópia normalizada de 'nome' para buscas exatas via índice (comandos do chat)
+    nome_lower: Optional[str] = None
+
+    @before_event(Insert, Replace, Save, SaveChanges)
+    def sincronizar_nome_lower(self):
+        self.nome_lower = self.nome.casefold().strip()
+
+    @classmethod
+    def listar_com_responsavel(cls, filtro: Optional[Dict[str, Any]] = None):
+        """
+        Projetos com o responsável já embutido, num único aggregate ($lookup), em vez do
+        fetch_links; traz só os campos de ProjetoResumo (sem senha do responsável).
+        """
+        pipeline = [{"$match": filtro}] if filtro else []
+        pipeline += [
+            {"$lookup": {"from": "funcionarios", "localField": "responsavel.$id", "foreignField": "_id", "as": "responsavel"}},
+            {"$unwind": {"path": "$responsavel", "preserveNullAndEmptyArrays": True}},
+            {"$project": {"nome_lower": 0, "responsavel.senha": 0, "responsavel.dataCadastro": 0}},
+        ]
+        return cls.aggregate(pipeline, projection_model=ProjetoResumo)
 
     class Settings:
         name = "projetos"
+        indexes = [
+            IndexModel([("nome_lower", ASCENDING)]),
+            # Projetos do usuário logado (contexto da IA)
+            IndexModel([("responsavel.$id", ASCENDING)]),
+        ]
 
 class Tarefa(Document):
     nome: str
@@ -56,9 +91,53 @@ class Tarefa(Document):
     condicao: Optional[str] = None
     documento_referencia: Optional[str] = None
     concluido: Optional[bool] = False
+    # Cópia normalizada de 'nome' para buscas exatas via índice (comandos do chat)
+    nome_lower: Optional[str] = None
+
+    @before_event(Insert, Replace, Save, SaveChanges)
+    def sincronizar_nome_lower(self):
+        self.nome_lower = self.nome.casefold().strip()
+
+    @classmethod
+    def listar_com_links(
+        cls,
+        filtro: Optional[Dict[str, Any]] = None,
+        departamento: Optional[str] = None,
+        ordenacao: Optional[Dict[str, int]] = None,
+    ):
+        """
+        Tarefas com responsável e projeto embutidos num único aggregate ($lookup), no
+        formato de TarefaResumo. Filtro e ordenação rodam antes dos $lookup (usando os
+        índices); o departamento, que depende do responsável, logo após o primeiro.
+        """
+        pipeline = [{"$match": filtro}] if filtro else []
+        if ordenacao:
+            pipeline.append({"$sort": ordenacao})
+        pipeline += [
+            {"$lookup": {"from": "funcionarios", "localField": "responsavel.$id", "foreignField": "_id", "as": "responsavel"}},
+            {"$unwind": {"path": "$responsavel", "preserveNullAndEmptyArrays": True}},
+        ]
+        if departamento:
+            pipeline.append({"$match": {"responsavel.departamento": departamento}})
+        pipeline += [
+            {"$lookup": {"from": "projetos", "localField": "projeto.$id", "foreignField": "_id", "as": "projeto"}},
+            {"$unwind": {"path": "$projeto", "preserveNullAndEmptyArrays": True}},
+            {"$project": {
+                "nome_lower": 0, "responsavel.senha": 0, "responsavel.dataCadastro": 0,
+                "projeto.responsavel": 0, "projeto.nome_lower": 0,
+            }},
+        ]
+        return cls.aggregate(pipeline, projection_model=TarefaResumo)
 
     class Settings:
         name = "tarefas"
+        # Igualdade -> ordenação -> intervalo: filtros por responsável/projeto já saem
+        # ordenados por urgência (prazo, prioridade) do índice, sem sort em memória
+        indexes = [
+            IndexModel([("nome_lower", ASCENDING)]),
+            IndexModel([("responsavel.$id", ASCENDING), ("prazo", ASCENDING), ("prioridade", DESCENDING), ("status", ASCENDING)]),
+            IndexModel([("projeto.$id", ASCENDING), ("prazo", ASCENDING), ("prioridade", DESCENDING)]),
+        ]
 
 class Calendario(Document):
     tipoEvento: str
@@ -66,9 +145,115 @@ class Calendario(Document):
     projeto: Optional[Link[Projeto]] = None
     tarefa: Optional[Link[Tarefa]] = None
 
+    @classmethod
+    def listar_com_links(cls):
+        """
+        Eventos com projeto (e o responsável dele) e tarefa embutidos num único aggregate
+        ($lookup), no formato de CalendarioResumo: sem a senha do responsável.
+        """
+        pipeline = [
+            {"$lookup": {"from": "projetos", "localField": "projeto.$id", "foreignField": "_id", "as": "projeto"}},
+            {"$unwind": {"path": "$projeto", "preserveNullAndEmptyArrays": True}},
+            {"$lookup": {"from": "funcionarios", "localField": "projeto.responsavel.$id", "foreignField": "_id", "as": "projeto.responsavel"}},
+            {"$unwind": {"path": "$projeto.responsavel", "preserveNullAndEmptyArrays": True}},
+            # Evento sem projeto: o $lookup acima deixa um 'projeto' vazio, que é removido
+            {"$addFields": {"projeto": {"$cond": [{"$ifNull": ["$projeto._id", False]}, "$projeto", "$$REMOVE"]}}},
+            {"$lookup": {"from": "tarefas", "localField": "tarefa.$id", "foreignField": "_id", "as": "tarefa"}},
+            {"$unwind": {"path": "$tarefa", "preserveNullAndEmptyArrays": True}},
+            {"$project": {
+                "projeto.nome_lower": 0, "projeto.responsavel.senha": 0, "projeto.responsavel.dataCadastro": 0,
+                "tarefa.nome_lower": 0, "tarefa.projeto": 0, "tarefa.responsavel": 0,
+            }},
+        ]
+        return cls.aggregate(pipeline, projection_model=CalendarioResumo)
+
     class Settings:
         name = "calendario"
 
+class JobIngestao(Document):
+    """Andamento de uma ingestão em segundo plano, visível para todos os workers."""
+    dono: str
+    status: str = "em andamento"
+    resultado: Optional[Dict[str, Any]] = None
+    criadoEm: datetime = Field(default_factory=datetime.utcnow)
+    # Pulso do worker que roda o job; parado há muito tempo = worker morreu no meio
+    atualizadoEm: datetime = Field(default_factory=datetime.utcnow)
+
+    class Settings:
+        name = "jobs_ingestao"
+        # Índice TTL: o Mongo remove o job 1h depois de criado
+        indexes = [IndexModel([("criadoEm", ASCENDING)], expireAfterSeconds=3600)]
+
+# --- Models de leitura (respostas enxutas) ---
+class FuncionarioPublico(BaseModel):
+    """Dados do funcionário que podem ir para o cliente (sem o hash da senha)."""
+    model_config = ConfigDict(populate_by_name=True)
+
+    id: PydanticObjectId = Field(alias="_id")
+    nome: str
+    sobrenome: str
+    email: EmailStr
+    cargo: Optional[str] = None
+    departamento: Optional[str] = None
+    fotoPerfil: Optional[str] = None
+
+class ProjetoResumo(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+
+    id: PydanticObjectId = Field(alias="_id")
+    nome: str
+    descricao: Optional[str] = None
+    categoria: Optional[str] = None
+    situacao: str
+    prazo: date
+    responsavel: Optional[FuncionarioPublico] = None
+
+class TarefaResumo(BaseModel):
+    """Tarefa com responsável (sem senha) e projeto (sem o responsável dele) embutidos."""
+    model_config = ConfigDict(populate_by_name=True)
+
+    id: PydanticObjectId = Field(alias="_id")
+    nome: str
+    descricao: Optional[str] = None
+    prioridade: PrioridadeTarefa = PrioridadeTarefa.MEDIA
+    status: StatusTarefa = StatusTarefa.NAO_INICIADA
+    dataCriacao: datetime
+    dataConclusao: Optional[date] = None
+    prazo: date
+    projeto: Optional[ProjetoResumo] = None
+    responsavel: Optional[FuncionarioPublico] = None
+    numero: Optional[str] = None
+    classificacao: Optional[str] = None
+    fase: Optional[str] = None
+    condicao: Optional[str] = None
+    documento_referencia: Optional[str] = None
+    concluido: Optional[bool] = False
+
+class CalendarioResumo(BaseModel):
+    """Evento com projeto (responsável sem senha) e tarefa (sem os links dela) embutidos."""
+    model_config = ConfigDict(populate_by_name=True)
+
+    id: PydanticObjectId = Field(alias="_id")
+    tipoEvento: str
+    data_hora_evento: datetime
+    projeto: Optional[ProjetoResumo] = None
+    tarefa: Optional[TarefaResumo] = None
+
+# Projeções usadas no contexto da IA: só os campos que entram no texto
+class ProjetoNome(BaseModel):
+    nome: str
+
+class TarefaContexto(BaseModel):
+    nome: str
+    status: StatusTarefa
+    prazo: date
+
+class FuncionarioContexto(BaseModel):
+    nome: str
+    sobrenome: str
+    cargo: Optional[str] = None
+    departamento: Optional[str] = None
+
 # --- Models para Update ---
 class FuncionarioUpdate(BaseModel):
     nome: Optional[str] = None